@@ -1 +1,6 @@
-from .main import App
+def __getattr__(name):
+    # Окно приложения (customtkinter) импортируется только по запросу: app.core и бенчмарки обходятся без GUI
+    if name == "App":
+        from .main import App
+        return App
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
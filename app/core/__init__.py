@@ -1 +1,2 @@
 from .hamster_farm import HamsterFarm
+from .metrics import metrics
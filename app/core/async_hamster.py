@@ -0,0 +1,642 @@
+from logging_config import logger
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import pathlib
+import tempfile
+import itertools
+import threading
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+
+from .hamster_helper import HamsterHelper, TAP_MIN_DELAY, TAP_MAX_DELAY, POPUP_DELAY
+from .my_driver import (BrowserNotFoundError, LEAN_CHROMIUM_ARGUMENTS, LEAN_BLOCKED_URLS, BLOCKED_SITES,
+                        detect_browser, get_browser_binary, host_resolver_rules, blocked_url_patterns)
+from .scripts import TAP_BATCH_SCRIPT, MORSE_SCRIPT, SNAPSHOT_SCRIPT, POPUP_WATCHER_SCRIPT, POPUP_LOG_SCRIPT
+from .snapshot import HamsterSnapshot
+from .recovery import RecoveryEngine
+from .energy_model import energy_model
+from .reward_state import reward_state, confirmed_items
+from .morse import daily_cipher, timing_plan, plan_duration
+from .metrics import metrics
+
+CHROMIUM_BROWSERS = ["chrome", "edge", "brave", "yandex", "vivaldi"]
+
+CDP_ACCOUNTS_PER_BROWSER = 20  # вкладок на браузер, если у фермы не задано accounts_per_browser > 1
+
+CDP_ARGUMENTS = [
+    '--remote-debugging-port=0',
+    '--no-first-run',
+    '--no-default-browser-check',
+    # Вкладки аккаунтов работают одновременно, фоновые не должны замедляться
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-renderer-backgrounding',
+]
+
+
+class CDPError(Exception):
+    """ Custom exception for Chrome DevTools Protocol errors. """
+    pass
+
+
+class AccountStopped(Exception):
+    """ Событие остановки установлено; StopIteration в корутинах использовать нельзя. """
+    pass
+
+
+class CDPConnection:
+    """ Одно websocket-соединение с браузером; сессии вкладок и iframe работают через sessionId. """
+
+    def __init__(self, ws_url: str):
+        self.ws_url = ws_url
+        self.counter = itertools.count(1)
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.listeners: Dict[str, List[Callable]] = {}
+        self.http = None
+        self.ws = None
+        self.reader = None
+
+    async def connect(self):
+        self.http = aiohttp.ClientSession()
+        self.ws = await self.http.ws_connect(self.ws_url, max_msg_size=0)
+        self.reader = asyncio.create_task(self.read_loop())
+
+    async def read_loop(self):
+        try:
+            async for message in self.ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                data = json.loads(message.data)
+
+                if 'id' in data:
+                    future = self.pending.pop(data['id'], None)
+                    if future is None or future.done():
+                        continue
+                    if 'error' in data:
+                        future.set_exception(CDPError(data['error'].get('message')))
+                    else:
+                        future.set_result(data.get('result', {}))
+                else:
+                    for listener in self.listeners.get(data.get('method'), []):
+                        listener(data.get('params', {}), data.get('sessionId'))
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(CDPError("The DevTools connection was closed."))
+            self.pending.clear()
+
+    async def send(self, method: str, params: Optional[dict] = None,
+                   session_id: Optional[str] = None, timeout: float = 30) -> dict:
+        message_id = next(self.counter)
+        message = {'id': message_id, 'method': method, 'params': params or {}}
+        if session_id:
+            message['sessionId'] = session_id
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[message_id] = future
+        await self.ws.send_str(json.dumps(message))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(message_id, None)
+
+    def on(self, method: str, listener: Callable):
+        self.listeners.setdefault(method, []).append(listener)
+
+    def off(self, method: str, listener: Callable):
+        if listener in self.listeners.get(method, []):
+            self.listeners[method].remove(listener)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self.reader is not None:
+            await asyncio.gather(self.reader, return_exceptions=True)
+        if self.http is not None:
+            await self.http.close()
+
+
+class CDPBrowser:
+    """ Браузер на Chromium, запущенный без WebDriver, с одним CDP-соединением на все вкладки. """
+
+    def __init__(self, headless: bool, profile: str = "default", blocked_sites=BLOCKED_SITES):
+        self.headless = headless
+        self.profile = profile
+        self.blocked_sites = blocked_sites
+        self.process = None
+        self.user_data_dir = None
+        self.connection: Optional[CDPConnection] = None
+
+    async def start(self, timeout: float = 30):
+        browser_name = detect_browser()
+        binary = get_browser_binary(browser_name) if browser_name in CHROMIUM_BROWSERS else None
+        if binary is None:
+            raise BrowserNotFoundError(f"The CDP engine needs a Chromium browser, found: {browser_name}")
+
+        self.user_data_dir = tempfile.mkdtemp(prefix="hamster-cdp-")
+        arguments = [binary, f'--user-data-dir={self.user_data_dir}'] + CDP_ARGUMENTS
+        if self.headless:
+            arguments += ['--headless=new', '--disable-gpu', '--no-sandbox']
+        if self.profile == "lean":
+            arguments += LEAN_CHROMIUM_ARGUMENTS
+        if self.blocked_sites:
+            arguments.append(host_resolver_rules(self.blocked_sites))
+        arguments.append('about:blank')
+
+        self.process = await asyncio.create_subprocess_exec(*arguments,
+                                                            stdout=asyncio.subprocess.DEVNULL,
+                                                            stderr=asyncio.subprocess.DEVNULL)
+
+        port = await self.read_devtools_port(timeout)
+        async with aiohttp.ClientSession() as http:
+            async with http.get(f"http://127.0.0.1:{port}/json/version") as response:
+                version = await response.json()
+
+        self.connection = CDPConnection(version['webSocketDebuggerUrl'])
+        await self.connection.connect()
+        logger.info(f"CDP browser has been started: {version.get('Browser')}.")
+
+    async def read_devtools_port(self, timeout: float) -> int:
+        """ Браузер пишет выбранный порт в DevToolsActivePort внутри профиля. """
+        path = os.path.join(self.user_data_dir, "DevToolsActivePort")
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.returncode is not None:
+                raise CDPError(f"The browser has exited with code {self.process.returncode}.")
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    return int(file.readline().strip())
+            except (OSError, ValueError):
+                await asyncio.sleep(0.1)
+        raise CDPError("The browser did not open a DevTools port in time.")
+
+    async def new_page(self, url: str, account: str) -> "CDPPage":
+        blocked_urls = (LEAN_BLOCKED_URLS if self.profile == "lean" else []) + blocked_url_patterns(self.blocked_sites)
+        page = CDPPage(self.connection, blocked_urls=blocked_urls, account=account)
+        try:
+            await page.open(url)
+        except BaseException:
+            await page.close()
+            raise
+        return page
+
+    async def close(self):
+        try:
+            if self.connection is not None:
+                await self.connection.send('Browser.close', timeout=5)
+        except (CDPError, asyncio.TimeoutError, aiohttp.ClientError):
+            pass
+        finally:
+            if self.connection is not None:
+                await self.connection.close()
+            if self.process is not None and self.process.returncode is None:
+                try:
+                    await asyncio.wait_for(self.process.wait(), 10)
+                except asyncio.TimeoutError:
+                    self.process.kill()
+            if self.user_data_dir is not None:
+                shutil.rmtree(self.user_data_dir, ignore_errors=True)
+            logger.info(f"CDP browser has been stopped.")
+
+
+class CDPPage:
+    """
+    Вкладка аккаунта. Скрипты выполняются в iframe хомяка: через его собственную сессию,
+    если iframe вынесен в отдельный процесс, иначе через изолированный мир во фрейме.
+    """
+
+    def __init__(self, connection: CDPConnection, blocked_urls: List[str], account: str):
+        self.connection = connection
+        self.blocked_urls = blocked_urls
+        self.account = account
+        self.target_id = None
+        self.session_id = None
+        self.frame_session_id = None
+        self.frame_context_id = None
+
+    async def open(self, url: str):
+        self.connection.on('Target.attachedToTarget', self.on_attached)
+        self.connection.on('Target.detachedFromTarget', self.on_detached)
+        self.connection.on('Network.loadingFailed', self.on_loading_failed)
+
+        self.target_id = (await self.connection.send('Target.createTarget', {'url': 'about:blank'}))['targetId']
+        self.session_id = (await self.connection.send('Target.attachToTarget',
+                                                      {'targetId': self.target_id, 'flatten': True}))['sessionId']
+        # iframe в отдельном процессе ждёт, пока в его сессии не включат блокировку URL
+        await self.connection.send('Target.setAutoAttach', {'autoAttach': True, 'waitForDebuggerOnStart': True,
+                                                            'flatten': True}, self.session_id)
+        await self.block_urls(self.session_id)
+        await self.navigate(url)
+
+    async def block_urls(self, session_id: str):
+        """ Network.setBlockedURLs действует только в той сессии (вкладке или iframe), где его вызвали. """
+        if self.blocked_urls:
+            await self.connection.send('Network.enable', {}, session_id)
+            await self.connection.send('Network.setBlockedURLs', {'urls': self.blocked_urls}, session_id)
+
+    async def prepare_frame(self, session_id: str):
+        try:
+            await self.block_urls(session_id)
+        except (CDPError, asyncio.TimeoutError) as e:
+            logger.warning(f"Failed to block URLs in the iframe: {e}")
+        finally:
+            try:
+                await self.connection.send('Runtime.runIfWaitingForDebugger', {}, session_id)
+            except (CDPError, asyncio.TimeoutError):
+                pass
+
+    async def navigate(self, url: str):
+        self.frame_session_id = None
+        self.frame_context_id = None
+        await self.connection.send('Page.navigate', {'url': url}, self.session_id)
+
+    def on_attached(self, params: dict, session_id: Optional[str]):
+        if session_id == self.session_id:
+            if params.get('targetInfo', {}).get('type') == 'iframe':
+                self.frame_session_id = params['sessionId']
+            asyncio.ensure_future(self.prepare_frame(params['sessionId']))
+
+    def on_loading_failed(self, params: dict, session_id: Optional[str]):
+        if session_id in (self.session_id, self.frame_session_id) and (params.get('blockedReason')
+                                              or params.get('errorText') == 'net::ERR_NAME_NOT_RESOLVED'):
+            metrics.counter("hamster_blocked_requests_total", "Requests blocked by the browser",
+                            account=self.account).inc()
+
+    def on_detached(self, params: dict, session_id: Optional[str]):
+        if params.get('sessionId') == self.frame_session_id:
+            self.frame_session_id = None
+
+    async def find_frame(self) -> bool:
+        """ Найти iframe хомяка. Возвращает False, если его ещё нет. """
+        if self.frame_session_id is not None:
+            return True
+
+        tree = await self.connection.send('Page.getFrameTree', {}, self.session_id)
+        children = tree['frameTree'].get('childFrames', [])
+        if not children:
+            return False
+        world = await self.connection.send('Page.createIsolatedWorld',
+                                           {'frameId': children[0]['frame']['id'], 'worldName': 'hamster'},
+                                           self.session_id)
+        self.frame_context_id = world['executionContextId']
+        return True
+
+    async def evaluate(self, expression: str, await_promise: bool = False, timeout: float = 30):
+        """ Выполнить выражение в iframe хомяка и вернуть его значение. """
+        params = {'expression': expression, 'returnByValue': True, 'awaitPromise': await_promise}
+        if self.frame_session_id is not None:
+            session_id = self.frame_session_id
+        elif self.frame_context_id is not None:
+            session_id = self.session_id
+            params['contextId'] = self.frame_context_id
+        else:
+            raise CDPError("The Hamster Kombat iframe was not found.")
+
+        result = await self.connection.send('Runtime.evaluate', params, session_id, timeout)
+        if 'exceptionDetails' in result:
+            details = result['exceptionDetails']
+            raise CDPError(details.get('exception', {}).get('description') or details.get('text'))
+        return result.get('result', {}).get('value')
+
+    async def close(self):
+        self.connection.off('Target.attachedToTarget', self.on_attached)
+        self.connection.off('Target.detachedFromTarget', self.on_detached)
+        self.connection.off('Network.loadingFailed', self.on_loading_failed)
+        try:
+            await self.connection.send('Target.closeTarget', {'targetId': self.target_id}, timeout=5)
+        except (CDPError, asyncio.TimeoutError, aiohttp.ClientError, ConnectionError):
+            pass
+
+
+class AsyncHamsterHelper:
+    """ Тот же цикл, что и у HamsterHelper, но корутиной поверх CDP вместо потока с Selenium. """
+
+    def __init__(self, name, src, platform, timeout, num_clicks, claim_daily_rewards, use_energy_boosts,
+                 stop_event: asyncio.Event, energy_aware_taps=True, tap_batch_size=100):
+        self.name = name
+        self.base_url = HamsterHelper.rewrite_html(name, src, platform)
+        self.timeout = timeout
+        self.num_clicks = num_clicks
+        self.claim_daily_rewards = claim_daily_rewards
+        self.use_energy_boosts = use_energy_boosts
+        self.stop_event = stop_event
+        self.energy_aware_taps = energy_aware_taps
+        self.tap_batch_size = tap_batch_size
+        self.energy_per_tap = 1
+        self.daily_cycle_time = 0
+        self.recovery = RecoveryEngine()
+        self.page: Optional[CDPPage] = None
+
+    async def sleep(self, delay: float):
+        """ Пауза, которая прерывается событием остановки. """
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+        if self.stop_event.is_set():
+            raise AccountStopped
+
+    async def wait_for(self, expression: str, timeout: float, poll: float = 0.25):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if await self.page.find_frame():
+                try:
+                    value = await self.page.evaluate(expression)
+                    if value:
+                        return value
+                except CDPError:
+                    pass
+            await self.sleep(poll)
+        raise asyncio.TimeoutError(f"Timed out waiting for: {expression}")
+
+    async def click(self, selector: str, index: int = 0) -> bool:
+        return await self.page.evaluate(
+            f"(function() {{ var elements = document.querySelectorAll({json.dumps(selector)});"
+            f" if (elements.length > {index}) {{ elements[{index}].click(); return true; }} return false; }})()"
+        )
+
+    async def open(self, browser: CDPBrowser):
+        self.page = await browser.new_page(pathlib.Path(self.base_url).resolve().as_uri(), account=self.name)
+        await self.switch_to_iframe()
+
+    async def reopen(self):
+        await self.page.navigate(pathlib.Path(self.base_url).resolve().as_uri())
+        await self.switch_to_iframe()
+
+    async def switch_to_iframe(self):
+        hamster_username = await self.wait_for(
+            "(function() { var p = document.querySelector('a.user-info p'); return p && p.textContent; })()",
+            timeout=self.timeout + 30
+        )
+        await self.install_popup_watcher()
+        logger.info(f"Successful login to Hamster Kombat {hamster_username}!")
+
+    async def install_popup_watcher(self):
+        await self.page.evaluate(f"(function() {{{POPUP_WATCHER_SCRIPT}}}).apply(null, [{POPUP_DELAY}])")
+
+    async def dismiss_popups(self) -> list:
+        """ Прочитать журнал наблюдателя, который сам закрывает всплывающие окна. """
+        log = await self.page.evaluate(f"(function() {{{POPUP_LOG_SCRIPT}}})()")
+        if log is None:
+            await self.install_popup_watcher()
+            return []
+        for entry in log:
+            logger.info(f"Pop-up window '{entry['title']}' was {entry['action']}.")
+        return log
+
+    async def snapshot(self) -> HamsterSnapshot:
+        return HamsterSnapshot.from_script(await self.page.evaluate(f"(function() {{{SNAPSHOT_SCRIPT}}})()"))
+
+    async def get_energy(self):
+        snapshot = await self.snapshot()
+        if snapshot.active_tab != 0 or not snapshot.has_energy:
+            await self.click('.app-bar-item', 0)
+            await self.sleep(1)
+            snapshot = await self.snapshot()
+        if not snapshot.has_energy:
+            return 0, 1000
+        return snapshot.energy, snapshot.max_energy
+
+    async def tap_tap(self, num_taps, current_energy_balance, max_energy=None):
+        taps = 0
+        energy = current_energy_balance
+        energy_per_tap = self.energy_per_tap if self.energy_aware_taps else 0
+        start_time = time.time()
+
+        while taps < num_taps and not self.stop_event.is_set():
+            batch_size = min(self.tap_batch_size, num_taps - taps)
+            expression = (f"new Promise(function(resolve) {{ (function() {{{TAP_BATCH_SCRIPT}}})"
+                          f".apply(null, [{batch_size}, {TAP_MIN_DELAY}, {TAP_MAX_DELAY}, {energy_per_tap}, resolve]);"
+                          f" }})")
+            result = await self.page.evaluate(expression, await_promise=True,
+                                              timeout=batch_size * TAP_MAX_DELAY / 1000 + self.timeout)
+            taps += result['taps']
+            energy = result['energy']
+            for error in result['errors']:
+                logger.warning(f"Tap batch error: {error}")
+            if result['errors'] or result['taps'] < batch_size:
+                break
+
+        duration = time.time() - start_time
+        metrics.counter("hamster_taps_sent_total", "Taps sent to the page", account=self.name).inc(taps)
+        energy_model.rebase(self.name, energy, max_energy, time.time())
+        if current_energy_balance is not None and energy is not None and self.energy_aware_taps and taps >= 20:
+            spent = current_energy_balance - energy + duration * energy_model.rate(self.name)
+            self.energy_per_tap = max(1, round(spent / taps))
+        logger.info(f"Taps done: {taps}, energy left: {energy}.")
+
+    async def claim_rewards(self):
+        await self.click('.app-bar-item', 4)
+        await self.sleep(1)
+
+        pending_items = reward_state.pending(self.name, (await self.snapshot()).earn_items)
+        clicked_items = []
+        for earn_item in pending_items:
+            clicked = await self.page.evaluate(
+                f"(function() {{ var column = document.querySelectorAll('.earn-column')[{earn_item.column}];"
+                f" var item = column && column.querySelectorAll('.earn-item')[{earn_item.index}];"
+                f" if (item) {{ item.click(); return true; }} return false; }})()"
+            )
+            if not clicked:
+                continue
+            await self.sleep(1)
+            await self.dismiss_popups()
+            clicked_items.append(earn_item)
+
+        if clicked_items:
+            reward_state.mark_claimed(self.name, confirmed_items(clicked_items, (await self.snapshot()).earn_items))
+
+    async def play_morse(self):
+        word = daily_cipher.get()
+        if not word or f"cipher:{word}" in reward_state.claimed(self.name):
+            return
+
+        await self.click('.app-bar-item', 0)
+        if not await self.click('.daily-cipher'):
+            return
+        plan = timing_plan(word)
+        expression = (f"new Promise(function(resolve) {{ (function() {{{MORSE_SCRIPT}}})"
+                      f".apply(null, [{json.dumps(plan)}, resolve]); }})")
+        result = await self.page.evaluate(expression, await_promise=True,
+                                          timeout=plan_duration(plan) / 1000 + self.timeout)
+        for error in result['errors']:
+            logger.warning(f"Morse input error: {error}")
+        await self.sleep(1)
+        entries = await self.dismiss_popups()
+        if result['errors'] or result['presses'] < len(plan) \
+                or not any(entry['action'] == 'pressed' for entry in entries):
+            logger.warning(f"The daily cipher {word} was not confirmed, it will be entered again.")
+            return
+        reward_state.mark_keys(self.name, {f"cipher:{word}"})
+        logger.info(f"The daily cipher {word} has been entered.")
+
+    async def use_boosts(self):
+        await self.click('.app-bar-item', 0)
+        if await self.click('.user-tap-boost'):
+            await self.sleep(1)
+            if await self.click('.boost-column .boost-item'):
+                # Кнопку в окне бустера нажмёт наблюдатель
+                await self.sleep(1)
+                logger.info(f"An energy booster was used.")
+            await self.dismiss_popups()
+
+    async def step(self) -> float:
+        """ Один шаг фарма. Возвращает время, когда аккаунту снова нужна работа. """
+        if time.time() > self.daily_cycle_time:
+            self.daily_cycle_time = time.time() + 2 * 60 * 60
+            if self.claim_daily_rewards:
+                await self.claim_rewards()
+                await self.play_morse()
+                logger.info(f"Daily rewards have been collected.")
+
+        snapshot = await self.snapshot()
+        if snapshot.popup:
+            await self.dismiss_popups()
+
+        current_energy_balance, max_energy_limit = await self.get_energy()
+        logger.info(f"Current energy balance: {current_energy_balance}")
+        metrics.gauge("hamster_energy", "Last energy sample", account=self.name).set(current_energy_balance)
+        energy_model.observe(self.name, current_energy_balance, max_energy_limit)
+
+        next_time = energy_model.wake_time(self.name, current_energy_balance, max_energy_limit)
+        if next_time <= time.time():
+            if self.energy_aware_taps:
+                num_taps = current_energy_balance // self.energy_per_tap
+            else:
+                num_taps = self.num_clicks
+            logger.info(f"Hamster Kombat coin mining has started: {num_taps} taps.")
+            await self.tap_tap(num_taps, current_energy_balance, max_energy_limit)
+            logger.info(f"Hamster Kombat coin mining has stopped.")
+            if self.use_energy_boosts and snapshot.boost_available:
+                await self.use_boosts()
+            return time.time()
+
+        logger.info(f"Waiting for energy to fill: {(next_time - time.time()) / 60} min "
+                    f"({energy_model.rate(self.name):.2f} energy/s).")
+        if self.claim_daily_rewards:
+            next_time = min(next_time, self.daily_cycle_time)
+        return next_time
+
+    async def start(self, browser: CDPBrowser):
+        """ Начать добывать монеты пока не будет установлено событие остановки. """
+        if not self.base_url:
+            logger.error(f'The src specified for user [{self.name}] is incorrect.')
+            return
+
+        reopen = False
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    # Открытие и переоткрытие страницы повторяются с той же задержкой, что и шаги
+                    if self.page is None:
+                        await self.open(browser)
+                    elif reopen:
+                        await self.reopen()
+                    reopen = False
+
+                    start_time = time.perf_counter()
+                    next_time = await self.step()
+                    metrics.histogram("hamster_cycle_seconds", "Duration of one farming cycle",
+                                      account=self.name).observe(time.perf_counter() - start_time)
+                    self.recovery.record_success()
+                    await self.sleep(max(0.0, next_time - time.time()))
+
+                except (CDPError, asyncio.TimeoutError, aiohttp.ClientError, ConnectionError,
+                        TypeError, KeyError) as e:
+                    logger.warning(f"Something went wrong: {e}")
+                    if reopen and self.page is not None:
+                        # Вкладка не открылась заново (упала или отключилась): в следующий раз откроем новую
+                        await self.page.close()
+                        self.page = None
+                    reopen = True
+                    self.recovery.record_failure()
+                    if self.recovery.is_open():
+                        logger.warning(f"Too many failed recoveries, the account is paused.")
+                        await self.sleep(max(0.0, self.recovery.retry_time() - time.time()))
+                    else:
+                        await self.sleep(self.recovery.backoff(self.recovery.failures))
+
+        except AccountStopped:
+            logger.info(f"The program has been stopped.")
+
+        except Exception as e:
+            logger.error(f"Unknown error: {e}", exc_info=True)
+
+        finally:
+            if self.page is not None:
+                await self.page.close()
+
+
+class AsyncFarmEngine:
+    """ Все аккаунты фермы корутинами в одном event loop; accounts_per_browser вкладок на браузер. """
+
+    def __init__(self, users, platform, timeout, num_clicks, headless, claim_daily_rewards, use_energy_boosts,
+                 energy_aware_taps=True, accounts_per_browser=CDP_ACCOUNTS_PER_BROWSER, driver_profile="default",
+                 blocked_sites=BLOCKED_SITES):
+        self.users = users
+        self.platform = platform
+        self.timeout = timeout
+        self.num_clicks = num_clicks
+        self.headless = headless
+        self.claim_daily_rewards = claim_daily_rewards
+        self.use_energy_boosts = use_energy_boosts
+        self.energy_aware_taps = energy_aware_taps
+        self.accounts_per_browser = max(1, accounts_per_browser)
+        self.driver_profile = driver_profile
+        self.blocked_sites = blocked_sites
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stop_event: Optional[asyncio.Event] = None
+        self.thread: Optional[threading.Thread] = None
+        self.started = threading.Event()
+
+    def start(self):
+        self.thread = threading.Thread(name="CDP Engine", target=asyncio.run, args=(self.main(),), daemon=True)
+        self.thread.start()
+        self.started.wait(timeout=30)
+
+    def stop(self, timeout: float = 30):
+        if self.loop is not None and self.stop_event is not None:
+            self.loop.call_soon_threadsafe(self.stop_event.set)
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        self.started.set()
+
+        browsers: List[CDPBrowser] = []
+        tasks = []
+        try:
+            for n, (name, src) in enumerate(self.users):
+                if n % self.accounts_per_browser == 0:
+                    browser = CDPBrowser(headless=self.headless, profile=self.driver_profile,
+                                         blocked_sites=self.blocked_sites)
+                    await browser.start()
+                    browsers.append(browser)
+
+                helper = AsyncHamsterHelper(name=name, src=src, platform=self.platform, timeout=self.timeout,
+                                            num_clicks=self.num_clicks,
+                                            claim_daily_rewards=self.claim_daily_rewards,
+                                            use_energy_boosts=self.use_energy_boosts,
+                                            stop_event=self.stop_event,
+                                            energy_aware_taps=self.energy_aware_taps)
+                tasks.append(asyncio.create_task(helper.start(browsers[-1]), name=f"Account {name}"))
+
+            logger.info(f"CDP engine has started {len(tasks)} accounts in {len(browsers)} browsers.")
+            await self.stop_event.wait()
+
+        except Exception as e:
+            logger.error(f"Caught a bug in async_hamster.py: {e}", exc_info=True)
+
+        finally:
+            self.stop_event.set()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for browser in browsers:
+                await browser.close()
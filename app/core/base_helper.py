@@ -1,19 +1,111 @@
 from logging_config import logger
 
-import sys
+from typing import Optional
 from selenium.common.exceptions import WebDriverException
 
 
-from .my_driver import get_web_driver
+from .my_driver import BLOCKED_SITES, get_web_driver, acquire_profile_dir, release_profile_dir
+from .driver_pool import DriverPool
+from .shared_browser import SharedBrowser
 
 
 class BaseHelper(object):
-    def __init__(self, headless):
-        self.driver = get_web_driver(headless=headless)
+    def __init__(self, headless, driver_pool: Optional[DriverPool] = None,
+                 shared_browser: Optional[SharedBrowser] = None, driver_profile: str = "default",
+                 profile_name: Optional[str] = None, blocked_sites=BLOCKED_SITES, count_blocked: bool = False):
+        self.headless = headless
+        self.blocked_sites = blocked_sites
+        self.count_blocked = count_blocked
+        self.driver_pool = driver_pool
+        self.shared_browser = shared_browser
+        self.driver_profile = driver_profile
+        self.profile_name = profile_name
+        self.window_handle = None
+        self.user_data_dir = None
+        self.driver = None
+
+        if self.shared_browser is not None:
+            self.driver = self.shared_browser.driver
+        elif self.driver_pool is None:
+            self.start_driver()
+
+    def start_driver(self):
+        """ Запустить собственный браузер аккаунта. """
+        # Постоянный профиль имеет смысл только у собственного браузера аккаунта
+        if self.profile_name is not None:
+            self.user_data_dir = acquire_profile_dir(self.profile_name)
+        self.driver = get_web_driver(headless=self.headless, profile=self.driver_profile,
+                                     user_data_dir=self.user_data_dir, blocked_sites=self.blocked_sites,
+                                     count_blocked=self.count_blocked)
         logger.info(f"WebDriver has been successfully initialized.")
 
-    def close(self):
-        """ Остановка Webdriver. """
+    def recycle_driver(self):
+        """ Заменить браузер аккаунта новым. Страницу аккаунта нужно открыть заново. """
+        if self.shared_browser is not None:
+            # Общий браузер не перезапускаем ради одного аккаунта, только его вкладку
+            if self.window_handle is not None:
+                self.shared_browser.close_tab(self.window_handle)
+            with self.shared_browser.lock:
+                self.window_handle = self.shared_browser.open_tab()
+
+        elif self.driver_pool is not None:
+            if self.driver is not None:
+                self.driver_pool.discard(self.driver)
+            self.driver, _ = self.driver_pool.acquire(owner=self)
+
+        else:
+            self.quit_driver()
+            self.start_driver()
+
+    @property
+    def lazy_driver(self) -> bool:
+        """ Браузер выдаётся только на время работы: из пула или общая вкладка. """
+        return self.driver_pool is not None or self.shared_browser is not None
+
+    def acquire_driver(self) -> bool:
+        """ Взять браузер из пула или свою вкладку. Возвращает True, если страница аккаунта в нём уже открыта. """
+        if self.shared_browser is not None:
+            self.shared_browser.lock.acquire()
+            try:
+                if self.window_handle is None:
+                    self.window_handle = self.shared_browser.open_tab()
+                    return False
+                self.driver.switch_to.window(self.window_handle)
+                return True
+            except BaseException:
+                # Иначе остальные аккаунты этого браузера будут ждать lock вечно
+                self.shared_browser.lock.release()
+                raise
+
+        if self.driver_pool is None or self.driver is not None:
+            return True
+        self.driver, warm = self.driver_pool.acquire(owner=self)
+        return warm
+
+    def release_driver(self):
+        """ Вернуть браузер в пул или отпустить общую вкладку на время ожидания. """
+        if self.shared_browser is not None:
+            try:
+                self.shared_browser.lock.release()
+            except RuntimeError:
+                pass
+
+        elif self.driver_pool is not None and self.driver is not None:
+            self.driver_pool.release(self.driver)
+            self.driver = None
+
+    def quit_driver(self):
+        """ Остановка Webdriver без завершения потока. """
+        if self.shared_browser is not None:
+            if self.window_handle is not None:
+                self.shared_browser.close_tab(self.window_handle)
+                self.window_handle = None
+            return
+
+        if self.driver_pool is not None:
+            self.release_driver()
+            return
+
         try:
             if self.driver:
                 self.driver.close()
@@ -24,4 +116,9 @@ class BaseHelper(object):
             logger.info(f"The browser window was closed before WebDriver was stopped.")
 
         finally:
-            sys.exit(0)
+            if self.user_data_dir is not None:
+                release_profile_dir(self.user_data_dir)
+
+    def close(self):
+        """ Остановка Webdriver. """
+        self.quit_driver()
@@ -0,0 +1,123 @@
+from logging_config import logger
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.common.exceptions import WebDriverException
+
+from .my_driver import BLOCKED_SITES, get_web_driver
+
+
+class DriverPoolTimeoutError(Exception):
+    """ Custom exception when no WebDriver was released in time. """
+    pass
+
+
+class DriverPool:
+    """
+    Ограниченный пул браузеров, которые аккаунты берут на время работы и возвращают на время ожидания.
+    Число живых браузеров никогда не превышает max_size, сколько бы ни было аккаунтов.
+    """
+
+    def __init__(self, max_size: int, headless: bool, profile: str = "default",
+                 blocked_sites=BLOCKED_SITES, count_blocked: bool = False):
+        self.max_size = max_size
+        self.headless = headless
+        self.profile = profile
+        self.blocked_sites = blocked_sites
+        self.count_blocked = count_blocked
+        self.idle: List[WebDriver] = []
+        self.owners: Dict[int, Any] = {}
+        self.live = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, owner: Any = None, timeout: Optional[float] = None) -> Tuple[WebDriver, bool]:
+        """
+        Взять браузер из пула.
+
+        Возвращает браузер и признак того, что последним им пользовался тот же owner,
+        т.е. его страница уже открыта и загружать её заново не нужно.
+        """
+        while True:
+            with self.condition:
+                driver = self.take_idle(owner)
+                if driver is None:
+                    if self.live < self.max_size:
+                        self.live += 1
+                    elif not self.condition.wait(timeout):
+                        raise DriverPoolTimeoutError(f"No WebDriver was released in {timeout} seconds.")
+                    else:
+                        continue
+
+            if driver is None:
+                return self.create(owner), False
+
+            if self.is_alive(driver):
+                with self.condition:
+                    warm = self.owners.get(id(driver)) is owner
+                    self.owners[id(driver)] = owner
+                return driver, warm
+
+            self.discard(driver)
+
+    def take_idle(self, owner: Any) -> Optional[WebDriver]:
+        """ Свободный браузер, предпочтительно тот, которым owner пользовался последним. """
+        for n, driver in enumerate(self.idle):
+            if self.owners.get(id(driver)) is owner:
+                return self.idle.pop(n)
+        if self.idle:
+            return self.idle.pop()
+        return None
+
+    def create(self, owner: Any) -> WebDriver:
+        try:
+            driver = get_web_driver(headless=self.headless, profile=self.profile,
+                                    blocked_sites=self.blocked_sites, count_blocked=self.count_blocked)
+        except Exception:
+            with self.condition:
+                self.live -= 1
+                self.condition.notify()
+            raise
+
+        with self.condition:
+            self.owners[id(driver)] = owner
+        logger.info(f"WebDriver pool has started a browser: {self.live}/{self.max_size}.")
+        return driver
+
+    def release(self, driver: WebDriver):
+        """ Вернуть браузер в пул. """
+        with self.condition:
+            self.idle.append(driver)
+            self.condition.notify()
+
+    def discard(self, driver: WebDriver):
+        """ Закрыть браузер и освободить его место в пуле. """
+        self.quit(driver)
+        with self.condition:
+            self.owners.pop(id(driver), None)
+            self.live -= 1
+            self.condition.notify()
+
+    def close(self):
+        """ Закрыть все свободные браузеры. """
+        with self.condition:
+            idle, self.idle = self.idle, []
+
+        for driver in idle:
+            self.discard(driver)
+
+    @staticmethod
+    def is_alive(driver: WebDriver) -> bool:
+        try:
+            _ = driver.current_window_handle
+            return True
+        except WebDriverException:
+            return False
+
+    @staticmethod
+    def quit(driver: WebDriver):
+        try:
+            driver.quit()
+        except WebDriverException:
+            logger.info(f"The browser window was closed before WebDriver was stopped.")
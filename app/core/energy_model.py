@@ -0,0 +1,115 @@
+from logging_config import logger
+
+import os
+import json
+import time
+import threading
+from typing import Dict, Optional
+
+base_path = os.path.dirname(__file__)
+
+ENERGY_MODEL_PATH = os.path.join(base_path, "energy_model.json")
+
+DEFAULT_REFILL_RATE = 100 / 30  # энергии в секунду без улучшений
+TAP_THRESHOLD = 0.75  # нажимать, когда энергии больше этой доли от максимума
+MIN_SAMPLE_INTERVAL = 5  # секунд между замерами, иначе погрешность счётчика слишком велика
+SAVE_INTERVAL = 60
+
+
+class EnergyModel:
+    """
+    Скорость восстановления энергии каждого аккаунта, выученная по соседним замерам энергии
+    (экспоненциальное среднее), с сохранением между запусками.
+    """
+
+    def __init__(self, path: str = ENERGY_MODEL_PATH, alpha: float = 0.3):
+        self.path = path
+        self.alpha = alpha
+        self.rates: Dict[str, float] = {}
+        # Последний замер без нажатий после него: {аккаунт: (энергия, максимум, время)}
+        self.samples: Dict[str, tuple] = {}
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.saved_at = 0.0
+
+    def load(self):
+        with self.lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    self.rates.update({name: float(rate) for name, rate in json.load(file).items()})
+            except (OSError, ValueError, AttributeError):
+                pass
+
+    def save(self):
+        """ Дописать свои аккаунты в файл: шарды фермы делят его между собой. """
+        if not self.rates:
+            return
+        with self.lock:
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                data = {}
+            data.update(self.rates)
+
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(temp_path, "w", encoding="utf-8") as file:
+                    json.dump(data, file, indent=2)
+                os.replace(temp_path, self.path)
+                self.saved_at = time.time()
+            except OSError as e:
+                logger.warning(f"Failed to save the energy model: {e}")
+
+    def rate(self, account: str) -> float:
+        self.load()
+        return self.rates.get(account, DEFAULT_REFILL_RATE)
+
+    def observe(self, account: str, energy: int, max_energy: int, timestamp: Optional[float] = None):
+        """ Замер энергии без нажатий с прошлого замера уточняет скорость восстановления. """
+        self.load()
+        timestamp = time.time() if timestamp is None else timestamp
+        previous = self.samples.get(account)
+        self.samples[account] = (energy, max_energy, timestamp)
+        if previous is None:
+            return
+
+        previous_energy, previous_max_energy, previous_time = previous
+        interval = timestamp - previous_time
+        gain = energy - previous_energy
+        # Упёршаяся в максимум энергия занижает скорость, а смена максимума - признак улучшения
+        if (interval < MIN_SAMPLE_INTERVAL or gain <= 0 or energy >= max_energy
+                or previous_max_energy != max_energy):
+            return
+
+        sample_rate = gain / interval
+        with self.lock:
+            rate = self.rates.get(account)
+            self.rates[account] = sample_rate if rate is None else rate + self.alpha * (sample_rate - rate)
+
+        if time.time() - self.saved_at > SAVE_INTERVAL:
+            self.save()
+
+    def rebase(self, account: str, energy: Optional[int] = None, max_energy: Optional[int] = None,
+               timestamp: Optional[float] = None):
+        """
+        После нажатий прошлый замер больше не годится для оценки. Энергия сразу после нажатий
+        становится новой точкой отсчёта, иначе скорость нельзя уточнить ни по одному шагу с нажатиями.
+        """
+        self.samples.pop(account, None)
+        if energy is not None and max_energy is not None:
+            self.observe(account, energy, max_energy, timestamp)
+
+    def wake_time(self, account: str, energy: int, max_energy: int, now: Optional[float] = None) -> float:
+        """ Когда энергия аккаунта превысит порог нажатий. """
+        now = time.time() if now is None else now
+        target = int(max_energy * TAP_THRESHOLD) + 1
+        if energy >= target:
+            return now
+        return now + (target - energy) / self.rate(account)
+
+
+energy_model = EnergyModel()
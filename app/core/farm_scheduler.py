@@ -0,0 +1,84 @@
+from logging_config import logger
+
+import heapq
+import time
+import itertools
+import threading
+from typing import Callable, List, Optional, Tuple
+
+
+Job = Callable[[], Optional[float]]
+
+
+class FarmScheduler:
+    """
+    Очередь с приоритетом "когда аккаунту снова нужна работа" и небольшой пул рабочих потоков.
+
+    Задача - функция без аргументов, которая возвращает время следующего запуска
+    или None, если её больше не нужно запускать.
+    """
+
+    def __init__(self, workers: int = 4):
+        self.workers = workers
+        self.queue: List[Tuple[float, int, Job]] = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    def schedule(self, due_time: float, job: Job):
+        """ Поставить задачу в очередь на момент due_time. """
+        with self.condition:
+            heapq.heappush(self.queue, (due_time, next(self.counter), job))
+            self.condition.notify()
+
+    def start(self):
+        self.stop_event.clear()
+        self.threads = []
+        for n in range(self.workers):
+            thread = threading.Thread(name=f"Worker {n}", target=self.worker, daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+    def stop(self, timeout: float = 30):
+        with self.condition:
+            self.stop_event.set()
+            self.condition.notify_all()
+
+        for thread in self.threads:
+            thread.join(timeout=timeout)
+
+        with self.condition:
+            self.queue.clear()
+
+    def next_job(self) -> Optional[Job]:
+        """ Дождаться задачи, время которой подошло. """
+        with self.condition:
+            while not self.stop_event.is_set():
+                if self.queue:
+                    delay = self.queue[0][0] - time.time()
+                    if delay <= 0:
+                        return heapq.heappop(self.queue)[2]
+                    self.condition.wait(delay)
+                else:
+                    self.condition.wait()
+        return None
+
+    def worker(self):
+        while True:
+            job = self.next_job()
+            if job is None:
+                break
+
+            try:
+                next_time = job()
+            except SystemExit:
+                # Аккаунт завершился через sys.exit: снимаем только его задачу, рабочий поток живёт дальше
+                logger.warning(f"A farm job has exited, it won't be scheduled again.")
+                next_time = None
+            except Exception as e:
+                logger.error(f"Caught a bug in farm_scheduler.py: {e}", exc_info=True)
+                next_time = None
+
+            if next_time is not None and not self.stop_event.is_set():
+                self.schedule(next_time, job)
@@ -0,0 +1,237 @@
+from logging_config import logger, LOG_APPEND_ENV
+
+import os
+import time
+import signal
+import threading
+import multiprocessing
+from multiprocessing.connection import Connection, wait
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import metrics
+from .recovery import RecoveryEngine
+
+STATUS_INTERVAL = 5  # секунд между отчётами шарда
+METRICS_INTERVAL = 30  # секунд между отчётами шарда с метриками
+HEARTBEAT_TIMEOUT = 120  # шард без отчётов дольше этого считается зависшим
+STOP_TIMEOUT = 60  # секунд на остановку по команде "stop"
+TERMINATE_TIMEOUT = 30  # секунд на остановку по SIGTERM, затем kill
+
+
+class ShardTerminated(Exception):
+    """ Custom exception when a shard process receives SIGTERM. """
+    pass
+
+
+def on_terminate(signum, frame):
+    raise ShardTerminated
+
+
+def report_status(shard_id: int, accounts: int, conn: Connection, stop_event: threading.Event):
+    """ Отчёты шарда родителю, в том числе пока ферма ещё запускает браузеры. """
+    metrics_time = 0.0
+    try:
+        while True:
+            # Каждый отчёт - короткий пульс, метрики целиком - только раз в METRICS_INTERVAL
+            status = {"shard": shard_id, "time": time.time(), "accounts": accounts}
+            if time.time() >= metrics_time:
+                metrics_time = time.time() + METRICS_INTERVAL
+                status.update(metrics=metrics.to_json(), prometheus=metrics.to_prometheus())
+            conn.send(status)
+            if stop_event.wait(STATUS_INTERVAL):
+                break
+    except (EOFError, OSError):
+        # Родитель закрыл pipe: это заметит основной поток шарда
+        pass
+
+
+def run_shard(shard_id: int, options: dict, users: List[Tuple[str, str]], conn: Connection):
+    """ Точка входа процесса шарда: своя ферма из части аккаунтов, статус родителю по pipe. """
+    from .hamster_farm import HamsterFarm
+
+    # По SIGTERM от супервизора браузеры закрываются так же, как по "stop" (на Windows terminate() сразу убивает)
+    signal.signal(signal.SIGTERM, on_terminate)
+    farm = HamsterFarm(users=users, **options)
+    # Запуск фермы разнесён на 1.5 с на аккаунт: пульс идёт из отдельного потока, чтобы супервизор
+    # не счёл большой шард зависшим. Поток только пишет в pipe, основной поток только читает
+    stop_event = threading.Event()
+    reporter = threading.Thread(name="Shard Reporter", target=report_status,
+                                args=(shard_id, len(users), conn, stop_event), daemon=True)
+    reporter.start()
+    try:
+        farm.activate_farm()
+        while not (conn.poll(STATUS_INTERVAL) and conn.recv() == "stop"):
+            pass
+    except ShardTerminated:
+        logger.warning(f"Shard {shard_id} has been terminated.")
+    except (EOFError, OSError):
+        logger.warning(f"Shard {shard_id} lost its supervisor.")
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        farm.deactivate_farm()
+        stop_event.set()
+        reporter.join(timeout=STATUS_INTERVAL * 2)
+        conn.close()
+
+
+class Shard:
+    def __init__(self, shard_id: int, users: List[Tuple[str, str]]):
+        self.shard_id = shard_id
+        self.users = users
+        self.process: Optional[multiprocessing.Process] = None
+        self.conn: Optional[Connection] = None
+        self.status: dict = {}
+        self.last_seen = 0.0
+        self.restarts = 0
+        self.restart_time = 0.0
+        self.recovery = RecoveryEngine(base_delay=5, max_delay=300)
+
+
+class ShardSupervisor:
+    """
+    Ферма, разделённая на процессы: у каждого шарда свои помощники, браузеры и GIL.
+    Родитель перезапускает упавшие и зависшие шарды и собирает их статус.
+    """
+
+    def __init__(self, users: List[Tuple[str, str]], processes: int, options: dict):
+        self.options = options
+        self.context = multiprocessing.get_context("spawn")
+        self.shards = [Shard(n, users[n::processes]) for n in range(processes) if users[n::processes]]
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def shard_options(self, shard: Shard) -> dict:
+        options = dict(self.options, processes=0, metrics_port=0)
+        trace_path = options.get("trace_path")
+        if trace_path:
+            # У каждого шарда своя трасса, иначе они перезапишут друг друга
+            options["trace_path"] = trace_path.replace(".json", f".shard{shard.shard_id}.json")
+        return options
+
+    def start_shard(self, shard: Shard):
+        # Шард наследует окружение при запуске и дописывает в лог родителя, а не обрезает его
+        os.environ[LOG_APPEND_ENV] = "1"
+        parent_conn, child_conn = self.context.Pipe()
+        shard.process = self.context.Process(name=f"Shard {shard.shard_id}", target=run_shard,
+                                             args=(shard.shard_id, self.shard_options(shard), shard.users,
+                                                   child_conn),
+                                             daemon=True)
+        shard.process.start()
+        child_conn.close()
+        shard.conn = parent_conn
+        shard.last_seen = time.time()
+        logger.info(f"Shard {shard.shard_id} has started with {len(shard.users)} accounts "
+                    f"(pid {shard.process.pid}).")
+
+    def start(self):
+        self.stop_event.clear()
+        for shard in self.shards:
+            self.start_shard(shard)
+        self.thread = threading.Thread(name="Shard Supervisor", target=self.supervise, daemon=True)
+        self.thread.start()
+
+    def collect(self, shard: Shard):
+        """ Забрать все накопившиеся отчёты шарда. """
+        try:
+            while shard.conn.poll():
+                status = shard.conn.recv()
+                shard.last_seen = time.time()
+                if "metrics" in status:
+                    metrics.set_external(f"shard{shard.shard_id}", status.pop("metrics"), status.pop("prometheus"))
+                shard.status = status
+        except (EOFError, OSError):
+            # Процесс шарда завершился: закрытый pipe больше не будит wait()
+            shard.conn.close()
+
+        metrics.gauge("hamster_shard_restarts", "Restarts of a farm shard process",
+                      shard=shard.shard_id).set(shard.restarts)
+
+    def check(self, shard: Shard):
+        """ Перезапустить шард, если процесс умер или давно не присылал статус. """
+        if shard.process.is_alive() and time.time() - shard.last_seen < HEARTBEAT_TIMEOUT:
+            if shard.restarts and time.time() - shard.last_seen < STATUS_INTERVAL * 2:
+                shard.recovery.record_success()
+            return
+
+        if shard.restart_time == 0.0:
+            if shard.process.is_alive():
+                logger.warning(f"Shard {shard.shard_id} has not reported for {HEARTBEAT_TIMEOUT} s, terminating it.")
+                self.terminate([shard])
+            else:
+                logger.warning(f"Shard {shard.shard_id} has died with exit code {shard.process.exitcode}.")
+            shard.process.join(timeout=10)
+            shard.conn.close()
+            shard.recovery.record_failure()
+            shard.restart_time = time.time() + shard.recovery.backoff(shard.recovery.failures)
+
+        if time.time() >= shard.restart_time:
+            shard.restart_time = 0.0
+            shard.restarts += 1
+            self.start_shard(shard)
+
+    def supervise(self):
+        while not self.stop_event.wait(1):
+            for shard in self.shards:
+                try:
+                    self.collect(shard)
+                    self.check(shard)
+                except Exception as e:
+                    logger.error(f"Caught a bug in farm_shards.py: {e}", exc_info=True)
+
+    def wait_exit(self, shards: List[Shard], timeout: float) -> List[Shard]:
+        """
+        Ждать завершения процессов шардов, всё это время читая pipe всех шардов:
+        шард, который ждёт места в pipe для отчёта, не прочтёт "stop" и не закроет браузеры.
+        Возвращает шарды, которые ещё живы.
+        """
+        deadline = time.time() + timeout
+        while True:
+            alive = [shard for shard in shards if shard.process.is_alive()]
+            if not alive or time.time() >= deadline:
+                return alive
+            running = [shard for shard in self.shards if shard.process is not None and not shard.conn.closed]
+            wait([shard.conn for shard in running] + [shard.process.sentinel for shard in alive],
+                 timeout=min(1.0, max(0.0, deadline - time.time())))
+            for shard in running:
+                self.collect(shard)
+
+    def terminate(self, shards: List[Shard]):
+        """ SIGTERM, чтобы шард закрыл свои браузеры, и kill, только если он не успел. """
+        for shard in shards:
+            shard.process.terminate()
+        for shard in self.wait_exit(shards, TERMINATE_TIMEOUT):
+            logger.warning(f"Shard {shard.shard_id} did not stop in time, killing it.")
+            shard.process.kill()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=10)
+
+        shards = [shard for shard in self.shards if shard.process is not None]
+        for shard in shards:
+            if not shard.process.is_alive():
+                continue
+            try:
+                shard.conn.send("stop")
+            except (EOFError, OSError):
+                pass
+
+        alive = self.wait_exit(shards, STOP_TIMEOUT)
+        for shard in alive:
+            logger.warning(f"Shard {shard.shard_id} did not stop in {STOP_TIMEOUT} s, terminating it.")
+        self.terminate(alive)
+
+        for shard in shards:
+            shard.process.join(timeout=10)
+            shard.conn.close()
+            metrics.set_external(f"shard{shard.shard_id}", None)
+
+    def statuses(self) -> Dict[int, dict]:
+        """ Последний статус каждого шарда без метрик. """
+        return {shard.shard_id: {"pid": shard.process.pid if shard.process else None,
+                                 "alive": bool(shard.process and shard.process.is_alive()),
+                                 "accounts": len(shard.users),
+                                 "restarts": shard.restarts,
+                                 "last_seen": shard.last_seen}
+                for shard in self.shards}
@@ -2,11 +2,26 @@ from logging_config import logger
 
 import time
 import threading
-from typing import List, Tuple
-from dataclasses import dataclass, field
+import multiprocessing
+from typing import TYPE_CHECKING, List, Optional, Tuple
+import dataclasses
+from dataclasses import dataclass, field, fields
 
 
 from .hamster_helper import HamsterHelper
+from .farm_scheduler import FarmScheduler
+from .driver_pool import DriverPool
+from .shared_browser import SharedBrowser
+from .metrics import metrics
+from .tracing import tracer
+from .my_driver import BLOCKED_SITES, evict_profiles
+from .morse import daily_cipher
+from .energy_model import energy_model
+from .farm_shards import ShardSupervisor
+
+if TYPE_CHECKING:
+    # aiohttp нужен только движку CDP, он импортируется при его запуске
+    from .async_hamster import AsyncFarmEngine
 
 
 @dataclass
@@ -17,22 +32,128 @@ class HamsterFarm:
     headless: bool = False
     claim_daily_rewards: bool = False
     use_energy_boosts: bool = False
+    tap_mode: str = "batch"  # "batch" | "click"
+    energy_aware_taps: bool = True
+    workers: int = 0  # 0 - отдельный поток на каждый аккаунт
+    max_browsers: int = 0  # 0 - отдельный браузер на каждый аккаунт
+    # >1 - аккаунты во вкладках общего браузера (если max_browsers = 0); движок CDP при 1 берёт 20 вкладок
+    accounts_per_browser: int = 1
+    driver_profile: str = "default"  # "default" | "lean"
+    persistent_profiles: bool = False  # постоянный --user-data-dir для браузера каждого аккаунта
+    page_delivery: str = "file"  # "file" | "data" - страница аккаунта как data: URL без записи на диск
+    blocked_sites: Tuple[str, ...] = BLOCKED_SITES  # не открываются ни в одной вкладке браузера
+    count_blocked_requests: bool = False  # журнал сети Chromium для счётчика заблокированных запросов
+    daily_cipher: str = ""  # слово ежедневного шифра Морзе, запоминается до конца игровых суток
+    metrics_port: int = 0  # >0 - отдавать метрики на http://127.0.0.1:<port>/metrics
+    trace_commands: bool = False  # трассировка каждой команды WebDriver
+    trace_path: str = "hamster_trace.json"
+    engine: str = "selenium"  # "selenium" | "cdp" - все аккаунты корутинами поверх DevTools в одном потоке
+    processes: int = 0  # >1 - аккаунты делятся на шарды, каждый в своём процессе
 
     users: List[Tuple[str, str]] = field(default_factory=list)
     threads: List[threading.Thread] = field(default_factory=list)
     tap_list: List[HamsterHelper] = field(default_factory=list)
+    scheduler: Optional[FarmScheduler] = None
+    driver_pool: Optional[DriverPool] = None
+    shared_browsers: List[SharedBrowser] = field(default_factory=list)
+    shared_browsers_lock: threading.Lock = field(default_factory=threading.Lock)
+    async_engine: Optional["AsyncFarmEngine"] = None
+    shard_supervisor: Optional[ShardSupervisor] = None
 
-    def user_start_farming(self, name, src):
+    def options(self) -> dict:
+        """ Настройки фермы без аккаунтов и состояния (у полей состояния значение по умолчанию None). """
+        return {f.name: getattr(self, f.name) for f in fields(self)
+                if f.default is not None and f.default_factory is dataclasses.MISSING}
+
+    def get_shared_browser(self) -> Optional[SharedBrowser]:
+        """ Общий браузер, в котором ещё есть место для вкладки аккаунта. """
+        if self.max_browsers > 0 or self.accounts_per_browser <= 1:
+            return None
+
+        with self.shared_browsers_lock:
+            for shared_browser in self.shared_browsers:
+                if shared_browser.accounts < self.accounts_per_browser:
+                    shared_browser.accounts += 1
+                    return shared_browser
+
+            shared_browser = SharedBrowser(headless=self.headless, profile=self.driver_profile,
+                                           blocked_sites=self.blocked_sites,
+                                           count_blocked=self.count_blocked_requests)
+            shared_browser.accounts += 1
+            self.shared_browsers.append(shared_browser)
+            return shared_browser
+
+    def create_helper(self, name, src) -> HamsterHelper:
         tap_halper = HamsterHelper(name=name, src=src, platform=self.platform,
                                    timeout=self.timeout,
                                    num_clicks=self.num_clicks,
                                    headless=self.headless,
                                    claim_daily_rewards=self.claim_daily_rewards,
-                                   use_energy_boosts=self.use_energy_boosts)
+                                   use_energy_boosts=self.use_energy_boosts,
+                                   tap_mode=self.tap_mode,
+                                   energy_aware_taps=self.energy_aware_taps,
+                                   driver_pool=self.driver_pool,
+                                   shared_browser=self.get_shared_browser(),
+                                   driver_profile=self.driver_profile,
+                                   persistent_profile=self.persistent_profiles,
+                                   page_delivery=self.page_delivery,
+                                   blocked_sites=self.blocked_sites,
+                                   count_blocked_requests=self.count_blocked_requests)
         self.tap_list.append(tap_halper)
+        return tap_halper
+
+    def user_start_farming(self, name, src):
+        tap_halper = self.create_helper(name, src)
         tap_halper.start()
 
+    def user_farming_job(self, name, src):
+        """ Задача планировщика для аккаунта: первый запуск открывает браузер. """
+        tap_halper = None
+
+        def job():
+            nonlocal tap_halper
+            if tap_halper is None:
+                tap_halper = self.create_helper(name, src)
+            return tap_halper.run_step()
+
+        return job
+
     def activate_farm(self):
+        tracer.enabled = self.trace_commands
+
+        if self.daily_cipher:
+            try:
+                daily_cipher.set(self.daily_cipher)
+            except ValueError as e:
+                logger.warning(f"The daily cipher is ignored: {e}")
+
+        if self.metrics_port > 0 and metrics.server is None:
+            try:
+                metrics.serve(self.metrics_port)
+            except OSError as e:
+                logger.warning(f"Failed to start the metrics server on port {self.metrics_port}: {e}")
+
+        if self.persistent_profiles and multiprocessing.parent_process() is None:
+            # Только в главном процессе: шард не знает, какие профили заняты другими шардами
+            evict_profiles()
+
+        if self.processes > 1:
+            self.activate_shards()
+            return
+
+        if self.engine == "cdp":
+            self.activate_async_engine()
+            return
+
+        if self.max_browsers > 0:
+            self.driver_pool = DriverPool(max_size=self.max_browsers, headless=self.headless,
+                                          profile=self.driver_profile, blocked_sites=self.blocked_sites,
+                                          count_blocked=self.count_blocked_requests)
+
+        if self.workers > 0:
+            self.activate_scheduler()
+            return
+
         try:
             self.threads = []
             for n, user in enumerate(self.users):
@@ -50,7 +171,119 @@ class HamsterFarm:
             logger.info(f"Caught a bug in hamster_farm.py: {e}")
             self.deactivate_farm()
 
+    def activate_scheduler(self):
+        try:
+            self.scheduler = FarmScheduler(workers=self.workers)
+            for n, (name, src) in enumerate(self.users):
+                # Разносим запуск браузеров, как и в режиме потоков
+                self.scheduler.schedule(time.time() + n * 1.5, self.user_farming_job(name, src))
+            self.scheduler.start()
+
+            logger.info(f"Hamster Kombat Farm program has launched with {self.workers} workers.")
+
+        except Exception as e:
+            logger.info(f"Caught a bug in hamster_farm.py: {e}")
+            self.deactivate_farm()
+
+    def activate_shards(self):
+        try:
+            self.shard_supervisor = ShardSupervisor(users=self.users, processes=self.processes,
+                                                    options=self.options())
+            self.shard_supervisor.start()
+
+            logger.info(f"Hamster Kombat Farm program has launched in {len(self.shard_supervisor.shards)} processes.")
+
+        except Exception as e:
+            logger.info(f"Caught a bug in hamster_farm.py: {e}")
+            self.deactivate_farm()
+
+    def activate_async_engine(self):
+        try:
+            from .async_hamster import AsyncFarmEngine, CDP_ACCOUNTS_PER_BROWSER
+        except ImportError as e:
+            logger.error(f"The CDP engine is not available, install aiohttp: {e}")
+            return
+
+        # Смысл движка CDP - много вкладок в одном браузере, браузер на аккаунт его бы перечеркнул
+        accounts_per_browser = self.accounts_per_browser if self.accounts_per_browser > 1 else CDP_ACCOUNTS_PER_BROWSER
+        try:
+            self.async_engine = AsyncFarmEngine(users=self.users, platform=self.platform, timeout=self.timeout,
+                                                num_clicks=self.num_clicks, headless=self.headless,
+                                                claim_daily_rewards=self.claim_daily_rewards,
+                                                use_energy_boosts=self.use_energy_boosts,
+                                                energy_aware_taps=self.energy_aware_taps,
+                                                accounts_per_browser=accounts_per_browser,
+                                                driver_profile=self.driver_profile,
+                                                blocked_sites=self.blocked_sites)
+            self.async_engine.start()
+
+            logger.info(f"Hamster Kombat Farm program has launched with the CDP engine.")
+
+        except Exception as e:
+            logger.info(f"Caught a bug in hamster_farm.py: {e}")
+            self.deactivate_farm()
+
+    def deactivate_scheduler(self):
+        try:
+            for tap_halper in self.tap_list:
+                tap_halper.stop()
+
+            if self.scheduler:
+                self.scheduler.stop()
+                self.scheduler = None
+
+            for tap_halper in self.tap_list:
+                tap_halper.quit_driver()
+
+            self.close_browsers()
+
+            logger.info(f"Hamster Kombat Farm program has ended.")
+
+        except Exception as e:
+            logger.info(f"Caught a bug in hamster_farm.py: {e}")
+
+    def close_browsers(self):
+        if self.driver_pool:
+            self.driver_pool.close()
+            self.driver_pool = None
+
+        for shared_browser in self.shared_browsers:
+            shared_browser.quit()
+        self.shared_browsers = []
+
+        metrics.shutdown()
+        energy_model.save()
+
+        if tracer.enabled:
+            self.dump_trace(self.trace_path)
+            tracer.enabled = False
+
+    def dump_trace(self, path: str, account: Optional[str] = None, window: Optional[float] = None):
+        """ Сохранить трассу команд WebDriver в формате Chrome trace-event. """
+        try:
+            tracer.dump(path, account=account, window=window)
+        except OSError as e:
+            logger.warning(f"Failed to save the WebDriver trace: {e}")
+
     def deactivate_farm(self):
+        if self.shard_supervisor:
+            self.shard_supervisor.stop()
+            self.shard_supervisor = None
+            metrics.shutdown()
+            logger.info(f"Hamster Kombat Farm program has ended.")
+            return
+
+        if self.async_engine:
+            self.async_engine.stop()
+            self.async_engine = None
+            self.close_browsers()
+            logger.info(f"Hamster Kombat Farm program has ended.")
+            return
+
+        if self.scheduler:
+            self.deactivate_scheduler()
+            return
+
         try:
             for tap_halper in self.tap_list:
                 tap_halper.stop()
@@ -59,6 +292,8 @@ class HamsterFarm:
             for thread in self.threads:
                 thread.join(timeout=30)
 
+            self.close_browsers()
+
             logger.info(f"Hamster Kombat Farm program has ended.")
 
         except Exception as e:
@@ -1,16 +1,11 @@
 from logging_config import logger
 
-import os
-import re
 import time
-import copy
 import random
 import threading
 from functools import wraps
 
-from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 from selenium.common.exceptions import (NoSuchElementException,
                                         ElementNotInteractableException,
@@ -21,24 +16,83 @@ from selenium.common.exceptions import (NoSuchElementException,
                                         WebDriverException)
 
 from .base_helper import BaseHelper
-
-base_path = os.path.dirname(__file__)
+from .scripts import (TAP_BATCH_SCRIPT, MORSE_SCRIPT, SNAPSHOT_SCRIPT, POPUP_WATCHER_SCRIPT, POPUP_LOG_SCRIPT,
+                      block_sites_script)
+from .snapshot import HamsterSnapshot
+from .metrics import metrics, MeteredWait
+from .my_driver import BLOCKED_SITES, get_driver_pid, get_driver_rss, count_blocked_requests
+from .tracing import tracer
+from .hamster_template import hamster_template
+from .energy_model import energy_model
+from .reward_state import reward_state, confirmed_items
+from .morse import daily_cipher, timing_plan, plan_duration
+from .locators import (ElementCache, IFRAME, USER_INFO, APP_BAR_ITEMS, TAP_BUTTON, ENERGY, BOOST_BUTTON,
+                       BOOST_COLUMNS, BOOST_ITEM, EARN_COLUMNS, EARN_ITEMS, DAILY_CIPHER)
+from .recovery import (RecoveryEngine, RecoveryFailedError, RECOVERY_LEVELS, REFIND, RELOAD_IFRAME,
+                       RECYCLE_DRIVER)
+
+TAP_MIN_DELAY = 10  # мс
+TAP_MAX_DELAY = 100  # мс
+
+# Бюджет ожидания готовности страницы для шагов, секунды
+STEP_BUDGETS = {
+    "scroll_page": 4,
+    "block_sites": 4,
+    "popup": 3,
+}
+
+POPUP_DELAY = 300  # мс от появления всплывающего окна до нажатия
+
+
+class ScrollSettled:
+    """ Условие для WebDriverWait: позиция прокрутки не изменилась между двумя проверками. """
+
+    def __init__(self):
+        self.last_position = None
+
+    def __call__(self, driver):
+        position = driver.execute_script(
+            "return [Math.round(window.scrollY), document.documentElement.scrollHeight];"
+        )
+        settled = position == self.last_position
+        self.last_position = position
+        return settled
 
 
 class HamsterHelper(BaseHelper):
     def __init__(self, name, src, platform, timeout, num_clicks, headless,
-                 claim_daily_rewards, use_energy_boosts):
-        super().__init__(headless=headless)
+                 claim_daily_rewards, use_energy_boosts, tap_mode="batch", tap_batch_size=100,
+                 energy_aware_taps=True, driver_pool=None, shared_browser=None, driver_profile="default",
+                 persistent_profile=False, page_delivery="file", blocked_sites=BLOCKED_SITES,
+                 count_blocked_requests=False):
+        super().__init__(headless=headless, driver_pool=driver_pool, shared_browser=shared_browser,
+                         driver_profile=driver_profile, profile_name=name if persistent_profile else None,
+                         blocked_sites=blocked_sites, count_blocked=count_blocked_requests)
         self.stop_event = threading.Event()
-        self.base_url = self.rewrite_html(name, src, platform)
+        self.name = name
+        self.base_url = self.rewrite_html(name, src, platform, page_delivery)
         self.timeout = timeout
         self.num_clicks = num_clicks
         self.claim_daily_rewards = claim_daily_rewards
         self.use_energy_boosts = use_energy_boosts
+        self.tap_mode = tap_mode
+        self.tap_batch_size = tap_batch_size
+        self.energy_aware_taps = energy_aware_taps
+        self.energy_per_tap = 1
+        self.daily_cycle_time = 0
+        self.recovery = RecoveryEngine()
+        self.recovering = False
+        self.page_opened = False
+        self.elements = ElementCache(account=name)
 
         if self.base_url:
-            self.driver.get(self.base_url)
-            self.switch_to_iframe()
+            if not self.lazy_driver:
+                self.trace_driver()
+                try:
+                    self.open_page()
+                except RecoveryFailedError as e:
+                    # Страница откроется заново в первом шаге: page_opened остался False
+                    logger.warning(f"Failed to open the account page: {e}")
         else:
             self.stop_event.set()
             logger.error(f'The src specified for user [{name}] is incorrect: {src}.')
@@ -49,172 +103,218 @@ class HamsterHelper(BaseHelper):
         def wrapper(self, *args, **kwargs):
             self: HamsterHelper
             attempts = 0
-            max_attempts = 3
+            max_attempts = len(RECOVERY_LEVELS)
 
             while not self.stop_event.is_set() and attempts < max_attempts:
+                start_time = time.perf_counter()
                 try:
-                    return func(self, *args, **kwargs)
+                    result = func(self, *args, **kwargs)
+                    # Предохранитель считает только неудачи подряд
+                    self.recovery.record_success()
+                    return result
+
+                except (StopIteration, RecoveryFailedError):
+                    # Вложенный шаг уже остановлен или исчерпал восстановление
+                    raise
 
                 except (ElementClickInterceptedException, ElementNotInteractableException):
-                    self.popup_window_button_large(massage=f"Press the pop-up window's button.")
-                    self.popup_window_button_close(massage=f"Close the pop-up window.")
+                    # Скорее всего, мешает всплывающее окно: его закроет наблюдатель
+                    self.dismiss_popups(expected=True)
 
-                except (TimeoutException, StaleElementReferenceException):
+                except (TimeoutException, StaleElementReferenceException, NoSuchElementException):
                     attempts += 1
                     logger.warning(f"Something went wrong: {attempts}th attempt to find an element.", exc_info=True)
-
-                except NoSuchElementException as e:
-                    logger.warning(f"The element was not found on the page: {e}", exc_info=True)
+                    self.recover(attempts)
 
                 except NoSuchWindowException:
+                    attempts += 1
                     logger.warning(f"The browser window was closed.")
-                    break
+                    self.recover(attempts, start_level=RECYCLE_DRIVER)
 
                 except (ConnectionError, WebDriverException):
-                    self.driver.refresh()
-                    self.switch_to_iframe()
-                    logger.warning(f"WebDriver has been restarted and there may be a connection problem.")
-
-                except StopIteration:
-                    logger.info(f"The program has been stopped.")
-                    break
+                    attempts += 1
+                    logger.warning(f"There may be a connection problem: {attempts}th attempt.", exc_info=True)
+                    self.recover(attempts, start_level=RELOAD_IFRAME)
 
                 except KeyboardInterrupt:
                     logger.warning(f"There was a forced program interruption or window closing.")
-                    break
+                    self.stop_event.set()
 
                 except Exception as e:
                     logger.error(f"Unknown error: {e}", exc_info=True)
-                    break
-
-            if attempts >= max_attempts:
-                self.driver.refresh()
-                self.switch_to_iframe()
-                logger.warning(f"WebDriver has been restarted and there may be a connection problem.")
-            else:
-                self.close()
+                    self.recovery.record_failure()
+                    raise RecoveryFailedError(f"{func.__name__} has failed: {e}") from e
 
-        return wrapper
+                finally:
+                    metrics.histogram("hamster_step_seconds", "Duration of HamsterHelper steps",
+                                      account=self.name, step=func.__name__).observe(time.perf_counter() - start_time)
 
-    @staticmethod
-    def rewrite_html(name, src, platform) -> str:
-        """ Перезаписать src в шаблоне html."""
+            if self.stop_event.is_set():
+                raise StopIteration
 
-        def extract_url(s):
-            match = re.search(r'src=["\']?([^"\'>\s]+)["\']?|([^"\'>\s]+)', s)
-            if match:
-                return match.group(1) or match.group(2)
-            return None
+            # Вместо None, который вызывающий код распаковал бы как результат шага
+            self.recovery.record_failure()
+            raise RecoveryFailedError(f"{func.__name__} has failed after {attempts} attempts.")
 
-        src = extract_url(src)
+        return wrapper
 
-        html_template_path = os.path.join(base_path, "hamster.html")
-        accounts_dir = os.path.join(base_path, 'accounts')
-        os.makedirs(accounts_dir, exist_ok=True)
-        html_user_path = os.path.join(accounts_dir, f"{name}.html")
+    def recover(self, attempt, start_level=REFIND):
+        """ Восстановиться после ошибки: чем больше попыток, тем дороже способ. """
+        if self.recovering:
+            # Вложенные вызовы во время восстановления только повторяют попытки
+            return
 
-        if re.search(r'tgWebAppPlatform=(web|ios|android|android_x)', src):
-            new_src = re.sub(r'tgWebAppPlatform=(web|ios|android|android_x)', f'tgWebAppPlatform={platform}', src)
+        level = self.recovery.level(attempt, start_level)
+        if self.stop_event.wait(self.recovery.backoff(attempt)):
+            return
 
-            with open(html_template_path, "r", encoding="utf-8") as file:
-                html_template_content = file.read()
+        self.recovering = True
+        try:
+            if level == RELOAD_IFRAME:
+                self.reload_iframe()
+            elif level == RECYCLE_DRIVER:
+                self.recycle_driver()
+                self.trace_driver()
+                self.open_page()
+            metrics.counter("hamster_recoveries_total", "Applied recoveries",
+                            account=self.name, level=level).inc()
+            logger.warning(f"Recovery has been applied: {level}.")
+
+        except (WebDriverException, RecoveryFailedError) as e:
+            logger.warning(f"Recovery {level} has failed: {e}")
+
+        finally:
+            self.recovering = False
+
+    def reload_iframe(self):
+        """ Перезагрузить только iframe хомяка, не всю страницу и не браузер. """
+        self.elements.clear()
+        self.driver.switch_to.default_content()
+        self.driver.execute_script(
+            "var frame = document.querySelector('iframe.payment-verification'); frame.src = frame.src;"
+        )
+        self.switch_to_iframe()
 
-            html_content = re.sub(r'src="[^"]*"', f'src="{new_src}"', html_template_content)
+    @staticmethod
+    def rewrite_html(name, src, platform, delivery="file") -> str:
+        """ Перезаписать src в шаблоне html."""
+        return hamster_template.url(name, src, platform, delivery)
+
+    def open_page(self):
+        """ Загрузить страницу аккаунта и перейти в iframe хомяка. """
+        self.page_opened = False
+        self.elements.clear()
+        self.driver.get(self.base_url)
+        self.switch_to_iframe()
+        self.page_opened = True
+
+    def trace_driver(self):
+        """ Включить трассировку команд WebDriver аккаунта, если она включена для фермы. """
+        if tracer.enabled:
+            tracer.install(self.driver)
+            tracer.set_account(self.name)
+
+    def acquire_page(self):
+        """ Взять браузер и открыть в нём страницу аккаунта, если она ещё не открыта. """
+        # Браузер, в котором загрузка страницы аккаунта сорвалась, тёплым не считается
+        warm = self.acquire_driver() and self.page_opened
+        self.trace_driver()
+        if not warm:
+            self.open_page()
+        elif self.shared_browser is not None:
+            self.enter_iframe()
+
+    def enter_iframe(self):
+        """ Вернуться в iframe хомяка после переключения вкладки. """
+        try:
+            self.elements.use(IFRAME, lambda: self.driver.find_element(*IFRAME), self.driver.switch_to.frame)
+        except NoSuchElementException:
+            self.open_page()
 
-            with open(html_user_path, "w", encoding="utf-8") as file:
-                file.write(html_content)
+    def wait(self, timeout, driver=None, **kwargs) -> MeteredWait:
+        """ WebDriverWait, время которого попадает в метрики аккаунта. """
+        return MeteredWait(driver or self.driver, timeout, account=self.name, **kwargs)
 
-            return html_user_path
+    def wait_ready(self, step, condition):
+        """ Дождаться условия готовности, но не дольше бюджета шага. """
+        start_time = time.time()
+        try:
+            self.wait(STEP_BUDGETS[step], poll_frequency=0.05).until(condition)
+        except TimeoutException:
+            logger.warning(f"Step {step} has exceeded its latency budget of {STEP_BUDGETS[step]} s.")
+        return time.time() - start_time
 
     @check_stop_event
     def scroll_page(self):
-        time.sleep(2)
+        """ Прокрутить страницу вниз и дождаться, пока прокрутка остановится. """
         self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(2)
+        self.wait_ready("scroll_page", ScrollSettled())
 
     @check_stop_event
     def block_sites(self, blocked_urls: list):
         """ Заблокировать переход на список сайтов. """
-        blocked_urls_script = ", ".join(f"'{url}'" for url in blocked_urls)
-        script = f"""
-                    (function() {{
-                        var originalOpen = window.open;
-                        window.open = function(url, name, specs) {{
-                            var blockedUrls = [{blocked_urls_script}];
-                            for (var i = 0; i < blockedUrls.length; i++) {{
-                                if (url.includes(blockedUrls[i])) {{
-                                    console.log('Blocked attempt to open URL: ' + url);
-                                    return null;
-                                }}
-                            }}
-                            return originalOpen.apply(this, arguments);
-                        }};
-                    }})();
-                """
-
-        time.sleep(2)
-        self.driver.execute_script(script)
-        time.sleep(2)
+        self.driver.execute_script(block_sites_script(blocked_urls))
+        self.wait_ready("block_sites",
+                        lambda driver: driver.execute_script("return !!(window.open && window.open.hamsterBlocked);"))
 
     @check_stop_event
     def switch_to_iframe(self):
         """ Переключится в iframe хомяка. """
-        iframe = WebDriverWait(self.driver, self.timeout + 30).until(
-            EC.presence_of_element_located((By.CLASS_NAME, 'payment-verification'))
-        )
+        self.elements.clear()
+        iframe = self.elements.resolve(IFRAME, lambda: self.wait(self.timeout + 30).until(
+            EC.presence_of_element_located(IFRAME)
+        ))
         self.driver.switch_to.frame(iframe)
 
-        user_info_element = WebDriverWait(self.driver, self.timeout + 30).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, 'a.user-info p'))
+        user_info_element = self.wait(self.timeout + 30).until(
+            EC.presence_of_element_located(USER_INFO)
         )
         hamster_username = user_info_element.text
 
-        self.popup_window_button_large(massage=f"Successful login to Hamster Kombat {hamster_username}!")
+        self.install_popup_watcher()
+        logger.info(f"Successful login to Hamster Kombat {hamster_username}!")
 
     @check_stop_event
-    def popup_window_button_large(self, massage=None):
-        """ Всплывающее окно. """
-        try:
-            large_button = WebDriverWait(self.driver, self.timeout / 2).until(
-                EC.element_to_be_clickable(
-                    (By.CLASS_NAME, 'bottom-sheet-button.button.button-primary.button-large'))
-            )
-            large_button.click()
-
-            if massage:
-                logger.info(massage)
-
-        except (TimeoutException, StaleElementReferenceException,
-                ElementClickInterceptedException, ElementNotInteractableException):
-            pass
+    def install_popup_watcher(self):
+        """ Установить в iframe наблюдатель, который сам закрывает всплывающие окна. """
+        self.driver.execute_script(POPUP_WATCHER_SCRIPT, POPUP_DELAY)
 
     @check_stop_event
-    def popup_window_button_close(self, massage=None):
-        """ Закрытие всплывающего окна. """
-        try:
-            close_button = WebDriverWait(self.driver, self.timeout / 2).until(
-                EC.element_to_be_clickable(
-                    (By.CLASS_NAME, 'bottom-sheet-close'))
-            )
-            close_button.click()
-
-            if massage:
-                logger.info(massage)
+    def dismiss_popups(self, expected=False) -> list:
+        """ Прочитать журнал наблюдателя; expected - подождать окно, которое должно появиться. """
+        entries = []
+
+        def logged(driver):
+            log = driver.execute_script(POPUP_LOG_SCRIPT)
+            if log is None:
+                # iframe перезагрузился вместе с наблюдателем
+                self.install_popup_watcher()
+                return False
+            entries.extend(log)
+            return bool(entries)
+
+        if expected:
+            try:
+                self.wait(STEP_BUDGETS["popup"], poll_frequency=0.1).until(logged)
+            except TimeoutException:
+                pass
+        else:
+            logged(self.driver)
 
-        except (TimeoutException, StaleElementReferenceException,
-                ElementClickInterceptedException, ElementNotInteractableException):
-            pass
+        for entry in entries:
+            logger.info(f"Pop-up window '{entry['title']}' was {entry['action']}.")
+            metrics.counter("hamster_popups_total", "Pop-up windows handled in the page",
+                            account=self.name, action=entry['action'].split(':')[0]).inc()
+        return entries
 
     @check_stop_event
     def app_bar_items(self, index, massage=None):
         """ Переход на элемент в нижнем меню. """
         self.scroll_page()
         try:
-            bar_buttons = WebDriverWait(self.driver, self.timeout).until(
-                EC.presence_of_all_elements_located(
-                    (By.CSS_SELECTOR, '.app-bar-item.no-select'))
-            )
-            bar_buttons[index].click()
+            self.elements.use(APP_BAR_ITEMS,
+                              lambda: self.wait(self.timeout).until(EC.presence_of_all_elements_located(APP_BAR_ITEMS)),
+                              lambda bar_buttons: bar_buttons[index].click())
 
             if massage:
                 logger.info(massage)
@@ -229,50 +329,87 @@ class HamsterHelper(BaseHelper):
         self.app_bar_items(index=0)
         self.scroll_page()
         try:
-            boosts_button = WebDriverWait(self.driver, self.timeout).until(
-                EC.presence_of_element_located(
-                    (By.CLASS_NAME, 'user-tap-boost'))
-            )
-            boosts_button.click()
+            self.elements.use(BOOST_BUTTON,
+                              lambda: self.wait(self.timeout).until(EC.presence_of_element_located(BOOST_BUTTON)),
+                              lambda boosts_button: boosts_button.click())
 
-            boosts_columns = WebDriverWait(self.driver, self.timeout).until(
-                EC.presence_of_all_elements_located(
-                    (By.CLASS_NAME, 'boost-column'))
+            boosts_columns = self.wait(self.timeout).until(
+                EC.presence_of_all_elements_located(BOOST_COLUMNS)
             )
 
-            boosts = WebDriverWait(boosts_columns[0], self.timeout).until(
-                EC.presence_of_element_located(
-                    (By.CLASS_NAME, 'boost-item'))
+            boosts = self.wait(self.timeout, boosts_columns[0]).until(
+                EC.presence_of_element_located(BOOST_ITEM)
             )
             boosts.click()
 
-            self.popup_window_button_large(massage=f"An energy booster was used.")
-            self.popup_window_button_close(massage=f"An energy booster wasn't used.")
+            if any(entry['action'] == 'pressed' for entry in self.dismiss_popups(expected=True)):
+                logger.info(f"An energy booster was used.")
+            else:
+                logger.info(f"An energy booster wasn't used.")
 
         except (TimeoutException, StaleElementReferenceException,
                 ElementClickInterceptedException, ElementNotInteractableException):
             pass
 
+    def tap_budget(self, current_energy_balance):
+        """ Сколько нажатий хватит на текущую энергию. """
+        if not self.energy_aware_taps:
+            return self.num_clicks
+        return current_energy_balance // self.energy_per_tap
+
+    def record_taps(self, energy_before, energy_after, taps, duration, max_energy=None):
+        """ Учесть серию нажатий в метриках и уточнить стоимость нажатия по расходу энергии. """
+        metrics.counter("hamster_taps_sent_total", "Taps sent to the page", account=self.name).inc(taps)
+        energy_model.rebase(self.name, energy_after, max_energy, time.time())
+        if energy_before is None or energy_after is None:
+            return
+
+        spent = energy_before - energy_after + duration * energy_model.rate(self.name)
+        metrics.counter("hamster_taps_accepted_total", "Taps counted by the game (by energy spent)",
+                        account=self.name).inc(min(taps, max(0, round(spent / self.energy_per_tap))))
+
+        if self.energy_aware_taps and taps >= 20:
+            self.energy_per_tap = max(1, round(spent / taps))
+
+    def read_energy_balance(self):
+        """ Текущая энергия по счётчику на странице без прокрутки и переходов. """
+        energy_limit_text = self.elements.use(ENERGY, lambda: self.driver.find_element(*ENERGY),
+                                              lambda element: element.text)
+        if '/' in energy_limit_text:
+            return int(energy_limit_text.split('/')[0].strip())
+        return None
+
     @check_stop_event
-    def tap_tap(self):
+    def tap_tap(self, num_taps=None, current_energy_balance=None, navigate=True, max_energy=None):
         """ Начать нажимать по кнопке. """
-        self.app_bar_items(index=0)
-        self.scroll_page()
+        if num_taps is None:
+            num_taps = self.num_clicks
 
-        hamster_button = WebDriverWait(self.driver, self.timeout).until(
-            EC.element_to_be_clickable(
-                (By.CLASS_NAME, 'user-tap-button.button'))
-        )
+        if navigate:
+            self.app_bar_items(index=0)
+            self.scroll_page()
 
-        for _ in range(self.num_clicks):
+        if self.tap_mode == "batch":
+            self.tap_batch(num_taps, current_energy_balance, max_energy)
+            return
+
+        def find_button():
+            return self.wait(self.timeout).until(EC.element_to_be_clickable(TAP_BUTTON))
+
+        def click(element):
+            element.click()
+
+        start_time = time.time()
+        taps = 0
+        for taps in range(1, num_taps + 1):
             # Начитаем нажимать на хомяка
             if not self.stop_event.is_set():
                 try:
                     try:
-                        hamster_button.click()
+                        self.elements.use(TAP_BUTTON, find_button, click)
                     except (TimeoutException, ElementClickInterceptedException):
                         self.scroll_page()
-                        hamster_button.click()
+                        self.elements.use(TAP_BUTTON, find_button, click)
                     time.sleep(random.randint(1, 10) / 100)
                 except ElementNotInteractableException:
                     logger.warning(f"Failed to click on the hamster button.")
@@ -280,54 +417,133 @@ class HamsterHelper(BaseHelper):
             else:
                 raise StopIteration
 
+            # Раз в 50 нажатий сверяемся со счётчиком энергии
+            if self.energy_aware_taps and taps % 50 == 0:
+                energy_balance = self.read_energy_balance()
+                if energy_balance is not None and energy_balance < self.energy_per_tap:
+                    break
+
+        self.record_taps(current_energy_balance, self.read_energy_balance(), taps, time.time() - start_time,
+                         max_energy)
+
+    def tap_batch(self, num_taps, current_energy_balance=None, max_energy=None):
+        """ Нажимать по кнопке пачками одним скриптом внутри iframe. """
+        summary = {'taps': 0, 'energy': None, 'errors': []}
+        energy_per_tap = self.energy_per_tap if self.energy_aware_taps else 0
+        start_time = time.time()
+        self.driver.set_script_timeout(self.tap_batch_size * TAP_MAX_DELAY / 1000 + self.timeout)
+
+        while summary['taps'] < num_taps:
+            if self.stop_event.is_set():
+                raise StopIteration
+
+            batch_size = min(self.tap_batch_size, num_taps - summary['taps'])
+            result = self.driver.execute_async_script(TAP_BATCH_SCRIPT, batch_size, TAP_MIN_DELAY, TAP_MAX_DELAY,
+                                                      energy_per_tap)
+
+            summary['taps'] += result['taps']
+            summary['energy'] = result['energy']
+            summary['errors'].extend(result['errors'])
+
+            if result['errors'] or result['taps'] < batch_size:
+                break
+
+        logger.info(f"Taps done: {summary['taps']}, energy left: {summary['energy']}, "
+                    f"errors: {len(summary['errors'])}.")
+        for error in summary['errors']:
+            logger.warning(f"Tap batch error: {error}")
+
+        self.record_taps(current_energy_balance, summary['energy'], summary['taps'], time.time() - start_time,
+                         max_energy)
+
+        return summary
+
     @check_stop_event
     def claim_rewards(self):
-        """ Собрать монеты со всех ежедневных активностей. """
+        """ Собрать монеты с ежедневных активностей, которые ещё не нажимались в эти сутки. """
         self.app_bar_items(index=4)
         self.scroll_page()
 
-        self.block_sites(blocked_urls=["youtu.be", "youtube.com",
-                                       "facebook.com",
-                                       "instagram.com",
-                                       "twitter.com", "x.com"])
+        # Браузер, запущенный без блокировки сайтов на уровне сети (IE), закрываем подменой window.open
+        if self.blocked_sites and not getattr(self.driver, "hamster_blocked_sites", False):
+            self.block_sites(blocked_urls=list(self.blocked_sites))
 
-        earn_column = WebDriverWait(self.driver, self.timeout).until(
-            EC.presence_of_all_elements_located(
-                (By.CLASS_NAME, 'earn-column'))
+        self.wait(self.timeout).until(
+            EC.presence_of_all_elements_located(EARN_ITEMS)
         )
+        pending_items = reward_state.pending(self.name, self.snapshot().earn_items)
+        logger.info(f"Daily tasks to claim: {len(pending_items)}.")
 
-        for column in earn_column:
-            # Получаем элементы содержащиеся в колонке
-            if not self.stop_event.is_set():
-                earn_items = WebDriverWait(column, self.timeout).until(
-                    EC.presence_of_all_elements_located(
-                        (By.CLASS_NAME, 'earn-item'))
-                )
-            else:
+        clicked_items = []
+        for earn_item in pending_items:
+            if self.stop_event.is_set():
                 raise StopIteration
 
-            for item in earn_items:
-                # Проходимся по всем элементам в колонке
-                if not self.stop_event.is_set():
-                    try:
-                        try:
-                            item.click()
-                        except (TimeoutException, ElementClickInterceptedException):
-                            self.scroll_page()
-                            item.click()
-                    except ElementNotInteractableException:
-                        logger.warning(f"The daily task was failed.")
-                        continue
-
-                    self.popup_window_button_large()
-                    self.popup_window_button_close()
-                else:
-                    raise StopIteration
+            # Элементы ищутся заново: после всплывающих окон старые ссылки устаревают
+            columns = self.driver.find_elements(*EARN_COLUMNS)
+            items = columns[earn_item.column].find_elements(*EARN_ITEMS) \
+                if earn_item.column < len(columns) else []
+            if earn_item.index >= len(items):
+                logger.warning(f"The daily task has disappeared: {earn_item.title}.")
+                continue
+            item = items[earn_item.index]
+            try:
+                try:
+                    item.click()
+                except (TimeoutException, ElementClickInterceptedException):
+                    self.scroll_page()
+                    item.click()
+            except ElementNotInteractableException:
+                logger.warning(f"The daily task was failed: {earn_item.title}.")
+                continue
+
+            self.dismiss_popups(expected=True)
+            clicked_items.append(earn_item)
+
+        if clicked_items:
+            # Задание считается выполненным только после подтверждения на странице
+            claimed_items = confirmed_items(clicked_items, self.snapshot().earn_items)
+            reward_state.mark_claimed(self.name, claimed_items)
+            logger.info(f"Daily tasks confirmed: {len(claimed_items)} of {len(clicked_items)}.")
 
     @check_stop_event
     def play_morse(self):
         """ Пройти ежедневную игру Морзе. """
-        pass
+        word = daily_cipher.get()
+        if not word:
+            logger.info(f"The daily cipher is not known yet.")
+            return
+        if f"cipher:{word}" in reward_state.claimed(self.name):
+            return
+
+        self.app_bar_items(index=0)
+        try:
+            self.elements.use(DAILY_CIPHER,
+                              lambda: self.wait(self.timeout).until(EC.element_to_be_clickable(DAILY_CIPHER)),
+                              lambda cipher_button: cipher_button.click())
+        except TimeoutException:
+            # Шифр уже разгадан или ещё не открыт: это не сбой страницы
+            logger.info(f"The daily cipher is not available.")
+            return
+
+        plan = timing_plan(word)
+        self.driver.set_script_timeout(plan_duration(plan) / 1000 + self.timeout)
+        result = self.driver.execute_async_script(MORSE_SCRIPT, plan)
+        for error in result['errors']:
+            logger.warning(f"Morse input error: {error}")
+
+        entries = self.dismiss_popups(expected=True)
+        if result['errors'] or result['presses'] < len(plan) \
+                or not any(entry['action'] == 'pressed' for entry in entries):
+            logger.warning(f"The daily cipher {word} was not confirmed, it will be entered again.")
+            return
+        reward_state.mark_keys(self.name, {f"cipher:{word}"})
+        logger.info(f"The daily cipher {word} has been entered.")
+
+    @check_stop_event
+    def snapshot(self) -> HamsterSnapshot:
+        """ Состояние страницы хомяка за один запрос к WebDriver. """
+        return HamsterSnapshot.from_script(self.driver.execute_script(SNAPSHOT_SCRIPT))
 
     @check_stop_event
     def get_energy(self):
@@ -340,11 +556,11 @@ class HamsterHelper(BaseHelper):
 
         while attempts < max_attempts:
             try:
-                energy_limit_element = WebDriverWait(self.driver, self.timeout).until(
-                    EC.presence_of_element_located(
-                        (By.CSS_SELECTOR, 'div.user-tap-energy p'))
+                energy_limit_text = self.elements.use(
+                    ENERGY,
+                    lambda: self.wait(self.timeout).until(EC.presence_of_element_located(ENERGY)),
+                    lambda element: element.text.strip()
                 )
-                energy_limit_text = copy.deepcopy(energy_limit_element.text.strip())
 
                 if '/' in energy_limit_text:
                     current_energy_balance, max_energy_limit = energy_limit_text.split('/')
@@ -362,64 +578,120 @@ class HamsterHelper(BaseHelper):
 
         return 0, 1000
 
+    def step(self) -> float:
+        """ Один шаг фарма. Возвращает время, когда аккаунту снова нужна работа. """
+        if self.recovery.is_open():
+            logger.warning(f"Too many failed recoveries, the account is paused.")
+            return self.recovery.retry_time()
+
+        # Полу-ежедневный цикл активностей
+        if time.time() > self.daily_cycle_time:
+            self.daily_cycle_time = time.time() + 2 * 60 * 60
+            if self.claim_daily_rewards:
+                self.claim_rewards()
+                self.play_morse()
+                logger.info(f"Daily rewards have been collected.")
+
+        snapshot = self.snapshot()
+        self.dismiss_popups(expected=snapshot.popup)
+
+        on_main_tab = snapshot.active_tab == 0 and snapshot.has_energy
+        if on_main_tab:
+            current_energy_balance, max_energy_limit = snapshot.energy, snapshot.max_energy
+        else:
+            current_energy_balance, max_energy_limit = self.get_energy()
+        logger.info(f"Current energy balance: {current_energy_balance}")
+        self.record_driver_state(current_energy_balance)
+        energy_model.observe(self.name, current_energy_balance, max_energy_limit)
+
+        next_time = energy_model.wake_time(self.name, current_energy_balance, max_energy_limit)
+        if next_time <= time.time():
+            num_taps = self.tap_budget(current_energy_balance)
+            logger.info(f"Hamster Kombat coin mining has started: {num_taps} taps.")
+            self.tap_tap(num_taps, current_energy_balance, navigate=not on_main_tab, max_energy=max_energy_limit)
+            logger.info(f"Hamster Kombat coin mining has stopped.")
+            if self.use_energy_boosts and (snapshot.boost_available or not on_main_tab):
+                self.use_boosts()
+            return time.time()
+
+        logger.info(f"Waiting for energy to fill: {(next_time - time.time()) / 60} min "
+                    f"({energy_model.rate(self.name):.2f} energy/s).")
+        if self.claim_daily_rewards:
+            next_time = min(next_time, self.daily_cycle_time)
+        return next_time
+
+    def timed_step(self) -> float:
+        """ step() с учётом длительности цикла в метриках. """
+        start_time = time.perf_counter()
+        try:
+            return self.step()
+        finally:
+            metrics.histogram("hamster_cycle_seconds", "Duration of one farming cycle",
+                              account=self.name).observe(time.perf_counter() - start_time)
+
+    def record_driver_state(self, current_energy_balance):
+        metrics.gauge("hamster_energy", "Last energy sample", account=self.name).set(current_energy_balance)
+        rss = get_driver_rss(self.driver)
+        if rss is not None:
+            # Метка браузера, а не аккаунта: в пуле и общем браузере память одна на несколько аккаунтов
+            metrics.gauge("hamster_driver_rss_bytes", "RSS of the driver and browser processes",
+                          browser=get_driver_pid(self.driver)).set(rss)
+        if getattr(self.driver, "hamster_request_log", False):
+            metrics.counter("hamster_blocked_requests_total", "Requests blocked by the browser",
+                            account=self.name).inc(count_blocked_requests(self.driver))
+
+    def run_step(self):
+        """ Шаг для планировщика фермы. Возвращает None, когда аккаунт закончил работу. """
+        if not self.stop_event.is_set():
+            try:
+                self.acquire_page()
+                return self.timed_step()
+
+            except StopIteration:
+                pass
+
+            except RecoveryFailedError as e:
+                logger.warning(f"The step has been skipped: {e}")
+                return time.time() + self.recovery.backoff(self.recovery.failures)
+
+            except Exception as e:
+                logger.error(f"Unknown error: {e}", exc_info=True)
+                self.recovery.record_failure()
+                return time.time() + self.recovery.backoff(self.recovery.failures)
+
+            finally:
+                self.release_driver()
+
+        self.quit_driver()
+        return None
+
     def start(self):
         """ Начать добывать монеты пока не будет установлено событие остановки. """
-        daily_cycle_time = 0
-
         while not self.stop_event.is_set():
             try:
-                # Полу-ежедневный цикл активностей
-                if time.time() > daily_cycle_time:
-                    daily_cycle_time = time.time() + 2 * 60 * 60
-                    if self.claim_daily_rewards:
-                        self.claim_rewards()
-                        logger.info(f"Daily rewards have been collected.")
-
-                current_energy_balance, max_energy_limit = self.get_energy()
-                logger.info(f"Current energy balance: {current_energy_balance}")
-
-                if (max_energy_limit - current_energy_balance) < max_energy_limit * 0.25:
-                    logger.info(f"Hamster Kombat coin mining has started.")
-                    self.tap_tap()
-                    logger.info(f"Hamster Kombat coin mining has stopped.")
-                    if self.use_energy_boosts:
-                        self.use_boosts()
+                try:
+                    self.acquire_page()
+                    end_time = self.timed_step()
+                finally:
+                    self.release_driver()
 
-                else:
-                    wait_time = (max_energy_limit - current_energy_balance) * (30 / 100)  # 100 за 30 сек
-                    logger.info(f"Waiting for energy to fill: {wait_time / 60} min.")
-                    end_time = time.time() + wait_time
-                    while time.time() < end_time:
-                        if not self.stop_event.is_set():
-                            time.sleep(0.1)
-                        else:
-                            raise StopIteration
+                # Спим до следующего шага, но просыпаемся сразу по stop()
+                if self.stop_event.wait(max(0.0, end_time - time.time())):
+                    raise StopIteration
 
             except StopIteration:
                 break
 
+            except RecoveryFailedError as e:
+                logger.warning(f"The step has been skipped: {e}")
+                self.stop_event.wait(self.recovery.backoff(self.recovery.failures))
+
             except Exception as e:
                 logger.error(f"Unknown error: {e}", exc_info=True)
-                break
+                self.recovery.record_failure()
+                self.stop_event.wait(self.recovery.backoff(self.recovery.failures))
 
         self.close()
 
     def stop(self):
         self.stop_event.set()
-
-
-MORSE_CODE_DICT = {'A': '.-', 'B': '-...',
-                   'C': '-.-.', 'D': '-..', 'E': '.',
-                   'F': '..-.', 'G': '--.', 'H': '....',
-                   'I': '..', 'J': '.---', 'K': '-.-',
-                   'L': '.-..', 'M': '--', 'N': '-.',
-                   'O': '---', 'P': '.--.', 'Q': '--.-',
-                   'R': '.-.', 'S': '...', 'T': '-',
-                   'U': '..-', 'V': '...-', 'W': '.--',
-                   'X': '-..-', 'Y': '-.--', 'Z': '--..',
-                   '1': '.----', '2': '..---', '3': '...--',
-                   '4': '....-', '5': '.....', '6': '-....',
-                   '7': '--...', '8': '---..', '9': '----.',
-                   '0': '-----', ', ': '--..--', '.': '.-.-.-',
-                   '?': '..--..', '/': '-..-.', '-': '-....-',
-                   '(': '-.--.', ')': '-.--.-'}
@@ -0,0 +1,89 @@
+import os
+import re
+import base64
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Dict, Optional
+
+base_path = os.path.dirname(__file__)
+
+PAGE_DELIVERIES = ["file", "data"]
+
+SRC_PATTERN = re.compile(r'src=["\']?([^"\'>\s]+)["\']?|([^"\'>\s]+)')
+PLATFORM_PATTERN = re.compile(r'tgWebAppPlatform=(web|ios|android|android_x)')
+IFRAME_SRC_PATTERN = re.compile(r'src="[^"]*"')
+
+
+def extract_url(s: str) -> Optional[str]:
+    """ Ссылка из src="..." или сама строка, если это уже ссылка. """
+    match = SRC_PATTERN.search(s)
+    if match:
+        return match.group(1) or match.group(2)
+    return None
+
+
+class HamsterTemplate:
+    """
+    Шаблон hamster.html, прочитанный один раз. Страница аккаунта перезаписывается на диске
+    только когда меняется её содержимое, либо отдаётся без диска как data: URL.
+    """
+
+    def __init__(self, template_path: str, accounts_dir: str):
+        self.template_path = template_path
+        self.accounts_dir = accounts_dir
+        self.content: Optional[str] = None
+        self.hashes: Dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    def load(self) -> str:
+        if self.content is None:
+            with self.lock:
+                if self.content is None:
+                    with open(self.template_path, "r", encoding="utf-8") as file:
+                        self.content = file.read()
+                    os.makedirs(self.accounts_dir, exist_ok=True)
+        return self.content
+
+    def render(self, src: str, platform: str) -> Optional[str]:
+        """ HTML страницы аккаунта или None, если src не похож на ссылку Hamster Kombat. """
+        return self.render_cached(self.load(), src, platform)
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def render_cached(content: str, src: str, platform: str) -> Optional[str]:
+        src = extract_url(src)
+        if not src or not PLATFORM_PATTERN.search(src):
+            return None
+        new_src = PLATFORM_PATTERN.sub(f'tgWebAppPlatform={platform}', src)
+        return IFRAME_SRC_PATTERN.sub(lambda match: f'src="{new_src}"', content)
+
+    def write(self, name: str, html: str) -> str:
+        """ Сохранить страницу аккаунта, если её содержимое изменилось. """
+        html_user_path = os.path.join(self.accounts_dir, f"{name}.html")
+        digest = hashlib.sha1(html.encode("utf-8")).hexdigest()
+
+        with self.lock:
+            if html_user_path not in self.hashes and os.path.exists(html_user_path):
+                with open(html_user_path, "rb") as file:
+                    self.hashes[html_user_path] = hashlib.sha1(file.read()).hexdigest()
+
+            if self.hashes.get(html_user_path) != digest:
+                with open(html_user_path, "w", encoding="utf-8", newline="") as file:
+                    file.write(html)
+                self.hashes[html_user_path] = digest
+
+        return html_user_path
+
+    def url(self, name: str, src: str, platform: str, delivery: str = "file") -> Optional[str]:
+        """ Адрес страницы аккаунта: путь к файлу или data: URL. """
+        html = self.render(src, platform)
+        if html is None:
+            return None
+        if delivery == "data":
+            return "data:text/html;charset=utf-8;base64," + base64.b64encode(html.encode("utf-8")).decode("ascii")
+        return self.write(name, html)
+
+
+hamster_template = HamsterTemplate(template_path=os.path.join(base_path, "hamster.html"),
+                                   accounts_dir=os.path.join(base_path, "accounts"))
@@ -0,0 +1,56 @@
+from typing import Callable, Dict, Tuple, TypeVar
+
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import StaleElementReferenceException
+
+from .metrics import metrics
+
+Locator = Tuple[str, str]
+T = TypeVar("T")
+
+# Страница аккаунта (вне iframe)
+IFRAME = (By.CLASS_NAME, 'payment-verification')
+
+# Игра внутри iframe
+USER_INFO = (By.CSS_SELECTOR, 'a.user-info p')
+APP_BAR_ITEMS = (By.CSS_SELECTOR, '.app-bar-item.no-select')
+TAP_BUTTON = (By.CLASS_NAME, 'user-tap-button.button')
+ENERGY = (By.CSS_SELECTOR, 'div.user-tap-energy p')
+BOOST_BUTTON = (By.CLASS_NAME, 'user-tap-boost')
+BOOST_COLUMNS = (By.CLASS_NAME, 'boost-column')
+BOOST_ITEM = (By.CLASS_NAME, 'boost-item')
+EARN_COLUMNS = (By.CLASS_NAME, 'earn-column')
+EARN_ITEMS = (By.CLASS_NAME, 'earn-item')
+DAILY_CIPHER = (By.CSS_SELECTOR, '.daily-cipher')
+# Кнопки всплывающих окон нажимает POPUP_WATCHER_SCRIPT внутри страницы
+
+
+class ElementCache:
+    """
+    Найденные на открытой странице элементы по локатору. Элемент используется без проверок
+    и ищется заново только когда WebDriver сообщает, что он устарел.
+    """
+
+    def __init__(self, account: str):
+        self.account = account
+        self.elements: Dict[Locator, object] = {}
+
+    def clear(self):
+        """ Страница или iframe загружены заново: все ссылки на элементы недействительны. """
+        self.elements.clear()
+
+    def resolve(self, locator: Locator, find: Callable[[], object]):
+        metrics.counter("hamster_element_lookups_total", "Element lookups sent to WebDriver",
+                        account=self.account).inc()
+        element = self.elements[locator] = find()
+        return element
+
+    def use(self, locator: Locator, find: Callable[[], object], action: Callable[[object], T]) -> T:
+        """ Выполнить action с элементом (или списком элементов) из кэша, найдя его при необходимости. """
+        element = self.elements.get(locator)
+        if element is None:
+            element = self.resolve(locator, find)
+        try:
+            return action(element)
+        except StaleElementReferenceException:
+            return action(self.resolve(locator, find))
@@ -0,0 +1,217 @@
+from logging_config import logger
+
+import json
+import time
+import bisect
+import threading
+from typing import Dict, Optional, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from selenium.webdriver.support.ui import WebDriverWait
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+    def to_json(self):
+        return self.value
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def to_json(self):
+        return self.value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    def to_json(self):
+        return {"count": self.count, "sum": round(self.sum, 6),
+                "avg": round(self.sum / self.count, 6) if self.count else 0.0}
+
+
+class MetricsRegistry:
+    """ Счётчики, значения и гистограммы фермы с метками аккаунта и шага. """
+
+    def __init__(self):
+        self.metrics: Dict[Tuple[str, Labels], object] = {}
+        self.descriptions: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+        # Метрики из других процессов (шардов фермы): {источник: (json, prometheus)}
+        self.external: Dict[str, Tuple[dict, str]] = {}
+
+    def get(self, cls, name: str, description: str, **labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.setdefault(key, cls())
+                self.descriptions.setdefault(name, description)
+        return metric
+
+    def counter(self, name: str, description: str = "", **labels) -> Counter:
+        return self.get(Counter, name, description, **labels)
+
+    def gauge(self, name: str, description: str = "", **labels) -> Gauge:
+        return self.get(Gauge, name, description, **labels)
+
+    def histogram(self, name: str, description: str = "", **labels) -> Histogram:
+        return self.get(Histogram, name, description, **labels)
+
+    def reset(self):
+        with self.lock:
+            self.metrics.clear()
+            self.external.clear()
+
+    def set_external(self, source: str, data: Optional[dict], prometheus: str = ""):
+        """ Последний снимок метрик другого процесса; None - убрать источник. """
+        with self.lock:
+            if data is None:
+                self.external.pop(source, None)
+            else:
+                self.external[source] = (data, prometheus)
+
+    def to_json(self) -> dict:
+        """ {account: {metric{labels}: value}} """
+        result = {}
+        for (name, labels), metric in sorted(self.metrics.items(), key=lambda item: item[0]):
+            labels = dict(labels)
+            account = labels.pop("account", "farm")
+            if labels:
+                name += "{" + ",".join(f"{k}={v}" for k, v in labels.items()) + "}"
+            result.setdefault(account, {})[name] = metric.to_json()
+
+        for data, _ in list(self.external.values()):
+            for account, account_metrics in data.items():
+                result.setdefault(account, {}).update(account_metrics)
+        return result
+
+    def to_prometheus(self) -> str:
+        lines = []
+        described = set()
+        for (name, labels), metric in sorted(self.metrics.items(), key=lambda item: item[0]):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {self.descriptions.get(name, '')}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+
+            if isinstance(metric, Histogram):
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float("inf"),), metric.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {metric.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {metric.count}")
+            else:
+                lines.append(f"{name}{format_labels(labels)} {metric.value}")
+
+        for _, prometheus in list(self.external.values()):
+            for line in prometheus.splitlines():
+                if line.startswith("# "):
+                    # HELP и TYPE каждой метрики выводятся один раз
+                    name = line.split()[2]
+                    if name in described:
+                        continue
+                    if line.startswith("# TYPE"):
+                        described.add(name)
+                lines.append(line)
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """ Отдавать метрики на локальном порту: /metrics (Prometheus) и /metrics.json. """
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(registry.to_json(), indent=2), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(name="Metrics Server", target=self.server.serve_forever, daemon=True).start()
+        logger.info(f"Metrics are available at http://{host}:{port}/metrics.")
+
+    def shutdown(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def escape_label_value(value: str) -> str:
+    """ Экранирование значения метки по текстовому формату Prometheus. """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label_value(v)}"' for k, v in labels) + "}"
+
+
+class MeteredWait(WebDriverWait):
+    """ WebDriverWait, который считает время ожидания аккаунта. """
+
+    def __init__(self, driver, timeout, account, **kwargs):
+        super().__init__(driver, timeout, **kwargs)
+        self.account = account
+
+    def until(self, method, message: str = ""):
+        start_time = time.perf_counter()
+        try:
+            return super().until(method, message)
+        finally:
+            metrics.histogram("hamster_wait_seconds", "Time spent in WebDriverWait",
+                              account=self.account).observe(time.perf_counter() - start_time)
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,107 @@
+from logging_config import logger
+
+import os
+import json
+import threading
+from typing import List, Optional, Tuple
+
+from .reward_state import reset_period
+
+base_path = os.path.dirname(__file__)
+
+DAILY_CIPHER_PATH = os.path.join(base_path, "daily_cipher.json")
+
+MORSE_CODE_DICT = {'A': '.-', 'B': '-...',
+                   'C': '-.-.', 'D': '-..', 'E': '.',
+                   'F': '..-.', 'G': '--.', 'H': '....',
+                   'I': '..', 'J': '.---', 'K': '-.-',
+                   'L': '.-..', 'M': '--', 'N': '-.',
+                   'O': '---', 'P': '.--.', 'Q': '--.-',
+                   'R': '.-.', 'S': '...', 'T': '-',
+                   'U': '..-', 'V': '...-', 'W': '.--',
+                   'X': '-..-', 'Y': '-.--', 'Z': '--..',
+                   '1': '.----', '2': '..---', '3': '...--',
+                   '4': '....-', '5': '.....', '6': '-....',
+                   '7': '--...', '8': '---..', '9': '----.',
+                   '0': '-----', ',': '--..--', '.': '.-.-.-',
+                   '?': '..--..', '/': '-..-.', '-': '-....-',
+                   '(': '-.--.', ')': '-.--.-'}
+
+MORSE_DECODE_DICT = {code: symbol for symbol, code in MORSE_CODE_DICT.items()}
+
+# Длительности нажатий и пауз, мс
+DOT_PRESS = 80  # короткое нажатие - точка
+DASH_PRESS = 750  # долгое нажатие - тире
+SYMBOL_GAP = 250  # между точками и тире одной буквы
+LETTER_GAP = 1500  # после буквы, чтобы игра её засчитала
+
+TimingPlan = List[Tuple[int, int]]  # [(нажатие, пауза после), ...]
+
+
+def encode(word: str) -> List[str]:
+    """ Код Морзе каждой буквы слова. """
+    try:
+        return [MORSE_CODE_DICT[symbol] for symbol in word.upper() if not symbol.isspace()]
+    except KeyError as e:
+        raise ValueError(f"The symbol {e} has no Morse code.") from None
+
+
+def decode(codes: List[str]) -> str:
+    """ Слово по кодам Морзе его букв. """
+    try:
+        return "".join(MORSE_DECODE_DICT[code] for code in codes)
+    except KeyError as e:
+        raise ValueError(f"Unknown Morse code: {e}.") from None
+
+
+def timing_plan(word: str) -> TimingPlan:
+    """ Нажатия по кнопке хомяка для всего слова. """
+    plan = []
+    for code in encode(word):
+        for n, signal in enumerate(code):
+            press = DOT_PRESS if signal == '.' else DASH_PRESS
+            plan.append((press, LETTER_GAP if n == len(code) - 1 else SYMBOL_GAP))
+    return plan
+
+
+def plan_duration(plan: TimingPlan) -> int:
+    """ Длительность плана, мс. """
+    return sum(press + pause for press, pause in plan)
+
+
+class DailyCipher:
+    """ Слово шифра на текущие игровые сутки, общее для всех аккаунтов и шардов фермы. """
+
+    def __init__(self, path: str = DAILY_CIPHER_PATH):
+        self.path = path
+        self.word: Optional[str] = None
+        self.period: Optional[int] = None
+        self.lock = threading.Lock()
+
+    def get(self) -> Optional[str]:
+        with self.lock:
+            if self.period != reset_period() or self.word is None:
+                self.word, self.period = None, reset_period()
+                try:
+                    with open(self.path, "r", encoding="utf-8") as file:
+                        data = json.load(file)
+                    if data.get("period") == self.period:
+                        self.word = data.get("word")
+                except (OSError, ValueError, AttributeError):
+                    pass
+            return self.word
+
+    def set(self, word: str):
+        """ Запомнить слово до конца игровых суток. """
+        word = word.strip().upper()
+        encode(word)
+        with self.lock:
+            self.word, self.period = word, reset_period()
+            try:
+                with open(self.path, "w", encoding="utf-8") as file:
+                    json.dump({"period": self.period, "word": self.word}, file)
+            except OSError as e:
+                logger.warning(f"Failed to save the daily cipher: {e}")
+
+
+daily_cipher = DailyCipher()
@@ -1,115 +1,467 @@
 from logging_config import logger
 
 import os
+import re
+import json
+import time
+import shutil
+import hashlib
 import platform
+import threading
 import subprocess
 
 from selenium import webdriver
 
+from .target_blocker import TargetBlocker
+
+base_path = os.path.dirname(__file__)
+
+BROWSERS = ["chrome", "edge", "firefox", "yandex", "brave", "vivaldi", "ie"]
+BROWSER_CACHE_PATH = os.path.join(base_path, "browser_cache.json")
+
+# Переопределение обнаружения браузера через переменные окружения
+BROWSER_ENV = "HAMSTER_BROWSER"  # имя браузера из BROWSERS
+BROWSER_BINARY_ENV = "HAMSTER_BROWSER_BINARY"  # путь к исполняемому файлу браузера
+DRIVER_BINARY_ENV = "HAMSTER_DRIVER_BINARY"  # путь к исполняемому файлу драйвера
+
+_detected_browser = None
+_detect_lock = threading.Lock()
+
+# Профили запуска браузера: "default" - как раньше, "lean" - минимум памяти и сети на аккаунт
+DRIVER_PROFILES = ["default", "lean"]
+
+LEAN_CHROMIUM_ARGUMENTS = [
+    '--disable-background-networking',
+    '--disable-extensions',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--mute-audio',
+    '--renderer-process-limit=2',
+]
+
+LEAN_BLOCKED_URLS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf',
+    '*.mp3', '*.mp4', '*.webm', '*.ogg', '*.wav',
+]
+
+# Сайты, на которые уводят задания Earn: блокируются для всего браузера при запуске
+BLOCKED_SITES = ("youtu.be", "youtube.com", "facebook.com", "instagram.com", "twitter.com", "x.com")
+
+# Постоянные профили браузера аккаунтов (--user-data-dir) с вытеснением давно не использованных
+PROFILES_DIR = os.path.join(base_path, "profiles")
+PROFILES_MAX_SIZE = 2 * 2 ** 30  # байты на все профили
+PROFILE_DISK_CACHE_SIZE = 100 * 2 ** 20  # байты HTTP-кэша одного профиля
+
+_active_profiles = set()
+_profiles_lock = threading.Lock()
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
 
 class BrowserNotFoundError(Exception):
     """ Custom exception when no one compatible browser is found. """
     pass
 
 
+WINDOWS_BROWSER_PATHS = {
+    "chrome": [
+        "C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe",
+        "C:\\Program Files (x86)\\Google\\Chrome\\Application\\chrome.exe"
+    ],
+    "firefox": [
+        "C:\\Program Files\\Mozilla Firefox\\firefox.exe",
+        "C:\\Program Files (x86)\\Mozilla Firefox\\firefox.exe"
+    ],
+    "edge": [
+        "C:\\Program Files (x86)\\Microsoft\\Edge\\Application\\msedge.exe",
+        "C:\\Program Files\\Microsoft\\Edge\\Application\\msedge.exe"
+    ],
+    "brave": [
+        "C:\\Program Files\\BraveSoftware\\Brave-Browser\\Application\\brave.exe",
+        "C:\\Program Files (x86)\\BraveSoftware\\Brave-Browser\\Application\\brave.exe"
+    ],
+    "yandex": [
+        "C:\\Program Files (x86)\\Yandex\\YandexBrowser\\browser.exe",
+        "C:\\Program Files\\Yandex\\YandexBrowser\\browser.exe"
+    ],
+    "vivaldi": [
+        "C:\\Program Files\\Vivaldi\\Application\\vivaldi.exe",
+        "C:\\Program Files (x86)\\Vivaldi\\Application\\vivaldi.exe"
+    ],
+    "ie": [
+        "C:\\Program Files\\Internet Explorer\\iexplore.exe",
+        "C:\\Program Files (x86)\\Internet Explorer\\iexplore.exe"
+    ],
+}
+
+DARWIN_BROWSER_PATHS = {
+    "chrome": "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+    "firefox": "/Applications/Firefox.app/Contents/MacOS/firefox",
+    "edge": "/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge",
+    "brave": "/Applications/Brave Browser.app/Contents/MacOS/Brave Browser",
+    "yandex": "/Applications/Yandex.app/Contents/MacOS/Yandex",
+    "vivaldi": "/Applications/Vivaldi.app/Contents/MacOS/Vivaldi",
+}
+
+LINUX_BROWSER_COMMANDS = {
+    "chrome": "google-chrome --version",
+    "firefox": "firefox --version",
+    "edge": "microsoft-edge --version",
+    "brave": "brave --version",
+    "yandex": "yandex-browser --version",
+    "vivaldi": "vivaldi --version",
+}
+
+
 def get_browser_path(browser_name):
     os_type = platform.system()
 
     if os_type == "Windows":
-        paths = {
-            "chrome": [
-                "C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe",
-                "C:\\Program Files (x86)\\Google\\Chrome\\Application\\chrome.exe"
-            ],
-            "firefox": [
-                "C:\\Program Files\\Mozilla Firefox\\firefox.exe",
-                "C:\\Program Files (x86)\\Mozilla Firefox\\firefox.exe"
-            ],
-            "edge": [
-                "C:\\Program Files (x86)\\Microsoft\\Edge\\Application\\msedge.exe",
-                "C:\\Program Files\\Microsoft\\Edge\\Application\\msedge.exe"
-            ],
-            "brave": [
-                "C:\\Program Files\\BraveSoftware\\Brave-Browser\\Application\\brave.exe",
-                "C:\\Program Files (x86)\\BraveSoftware\\Brave-Browser\\Application\\brave.exe"
-            ],
-            "yandex": [
-                "C:\\Program Files (x86)\\Yandex\\YandexBrowser\\browser.exe",
-                "C:\\Program Files\\Yandex\\YandexBrowser\\browser.exe"
-            ],
-            "vivaldi": [
-                "C:\\Program Files\\Vivaldi\\Application\\vivaldi.exe",
-                "C:\\Program Files (x86)\\Vivaldi\\Application\\vivaldi.exe"
-            ],
-            "ie": [
-                "C:\\Program Files\\Internet Explorer\\iexplore.exe",
-                "C:\\Program Files (x86)\\Internet Explorer\\iexplore.exe"
-            ],
-        }
-        for path in paths.get(browser_name, []):
+        for path in WINDOWS_BROWSER_PATHS.get(browser_name, []):
             if os.path.exists(path):
                 return True
 
     elif os_type == "Darwin":
-        paths = {
-            "chrome": "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
-            "firefox": "/Applications/Firefox.app/Contents/MacOS/firefox",
-            "edge": "/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge",
-            "brave": "/Applications/Brave Browser.app/Contents/MacOS/Brave Browser",
-            "yandex": "/Applications/Yandex.app/Contents/MacOS/Yandex",
-            "vivaldi": "/Applications/Vivaldi.app/Contents/MacOS/Vivaldi",
-        }
-        return os.path.exists(paths.get(browser_name, ""))
+        return os.path.exists(DARWIN_BROWSER_PATHS.get(browser_name, ""))
 
     elif os_type == "Linux":
-        commands = {
-            "chrome": "google-chrome --version",
-            "firefox": "firefox --version",
-            "edge": "microsoft-edge --version",
-            "brave": "brave --version",
-            "yandex": "yandex-browser --version",
-            "vivaldi": "vivaldi --version",
-        }
-        command = commands.get(browser_name)
+        command = LINUX_BROWSER_COMMANDS.get(browser_name)
         if command:
             try:
-                subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+                subprocess.run(command.split(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
                 return True
-            except subprocess.CalledProcessError:
+            except (subprocess.CalledProcessError, OSError):
                 return False
 
     return False
 
 
-def setup_webdriver(browser_name, headless):
+def get_browser_binary(browser_name):
+    """ Путь к исполняемому файлу браузера для запуска без WebDriver. """
+    browser_binary = os.environ.get(BROWSER_BINARY_ENV)
+    if browser_binary:
+        return browser_binary
+
+    os_type = platform.system()
+    if os_type == "Windows":
+        for path in WINDOWS_BROWSER_PATHS.get(browser_name, []):
+            if os.path.exists(path):
+                return path
+
+    elif os_type == "Darwin":
+        path = DARWIN_BROWSER_PATHS.get(browser_name, "")
+        if os.path.exists(path):
+            return path
+
+    elif os_type == "Linux":
+        command = LINUX_BROWSER_COMMANDS.get(browser_name)
+        if command:
+            return shutil.which(command.split()[0])
+
+    return None
+
+
+def browser_cache_key():
+    """ Ключ кэша: PATH и время изменения его каталогов, т.е. меняется при установке или удалении браузера. """
+    path = os.environ.get("PATH", "")
+    mtimes = []
+    for directory in path.split(os.pathsep):
+        try:
+            mtimes.append(os.stat(directory).st_mtime)
+        except OSError:
+            mtimes.append(None)
+    return hashlib.sha1(json.dumps([platform.system(), path, mtimes]).encode()).hexdigest()
+
+
+def read_browser_cache(key):
+    try:
+        with open(BROWSER_CACHE_PATH, "r", encoding="utf-8") as file:
+            cache = json.load(file)
+        if cache.get("key") == key and cache.get("browser") in BROWSERS:
+            return cache["browser"]
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def write_browser_cache(key, browser):
+    try:
+        with open(BROWSER_CACHE_PATH, "w", encoding="utf-8") as file:
+            json.dump({"key": key, "browser": browser}, file)
+    except OSError as e:
+        logger.warning(f"Failed to save the browser cache: {e}")
+
+
+def detect_browser():
+    """ Найти браузер один раз на процесс, с кэшем на диске между запусками. """
+    global _detected_browser
+
+    pinned_browser = os.environ.get(BROWSER_ENV)
+    if pinned_browser:
+        return pinned_browser
+
+    with _detect_lock:
+        if _detected_browser is None:
+            key = browser_cache_key()
+            _detected_browser = read_browser_cache(key)
+
+            if _detected_browser is None:
+                for browser in BROWSERS:
+                    if get_browser_path(browser):
+                        _detected_browser = browser
+                        write_browser_cache(key, browser)
+                        break
+                else:
+                    raise BrowserNotFoundError("No compatible browsers are installed.")
+
+            logger.info(f"Detected browser: {_detected_browser}.")
+
+        return _detected_browser
+
+
+def apply_lean_chromium_options(options):
+    for argument in LEAN_CHROMIUM_ARGUMENTS:
+        options.add_argument(argument)
+    options.page_load_strategy = 'eager'
+
+
+def blocked_url_patterns(sites):
+    """ Шаблоны Network.setBlockedURLs для сайта и всех его поддоменов. """
+    return [pattern for site in sites for pattern in (f'*://{site}/*', f'*://*.{site}/*')]
+
+
+def host_resolver_rules(sites):
+    """ Аргумент Chromium, с которым сайты не резолвятся ни в одной вкладке и окне браузера. """
+    rules = ", ".join(f"MAP {host} ~NOTFOUND" for site in sites for host in (site, f"*.{site}"))
+    return f'--host-resolver-rules={rules}'
+
+
+def apply_blocked_sites_chromium_options(options, sites, count_blocked):
+    if sites:
+        options.add_argument(host_resolver_rules(sites))
+    if count_blocked:
+        # Заблокированные запросы видны в журнале событий сети
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+        options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+
+
+def apply_chromium_session(driver, profile, sites):
+    """ Блокировка на уровне сети: картинки, шрифты и медиа в профиле lean и сайты из списка. """
+    urls = (LEAN_BLOCKED_URLS if profile == "lean" else []) + blocked_url_patterns(sites)
+    driver.hamster_blocked_urls = urls
+    driver.hamster_target_blocker = None
+    if not urls:
+        return
+
+    # Каждая вкладка и каждый iframe в своём процессе получают блокировку через отдельное соединение
+    try:
+        driver.hamster_target_blocker = TargetBlocker.for_driver(driver, urls)
+    except Exception as e:
+        logger.warning(f"Failed to block URLs in every browser target, only the WebDriver tab is covered: {e}")
+    block_urls_in_tab(driver)
+
+
+def block_urls_in_tab(driver):
+    """ Network.setBlockedURLs для текущей вкладки WebDriver, например только что открытой. """
+    urls = getattr(driver, "hamster_blocked_urls", None)
+    if urls:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': urls})
+
+
+def apply_blocked_sites_firefox_options(options, sites):
+    """ Сайты резолвятся в localhost, аналога --host-resolver-rules у Firefox нет. """
+    if sites:
+        options.set_preference('network.dns.localDomains',
+                               ",".join(host for site in sites for host in (site, f"www.{site}")))
+
+
+def count_blocked_requests(driver) -> int:
+    """ Заблокированные запросы из журнала событий сети с прошлого вызова. """
+    blocked = 0
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        if message.get('method') != 'Network.loadingFailed':
+            continue
+        params = message.get('params', {})
+        if params.get('blockedReason') or params.get('errorText') == 'net::ERR_NAME_NOT_RESOLVED':
+            blocked += 1
+    return blocked
+
+
+def apply_lean_firefox_options(options):
+    options.set_preference('permissions.default.image', 2)
+    options.set_preference('browser.display.use_document_fonts', 0)
+    options.set_preference('media.autoplay.default', 5)
+    options.set_preference('extensions.update.enabled', False)
+    options.set_preference('app.update.auto', False)
+    options.set_preference('network.prefetch-next', False)
+    options.set_preference('network.http.speculative-parallel-limit', 0)
+    options.set_preference('dom.ipc.processCount', 2)
+    options.page_load_strategy = 'eager'
+
+
+def get_directory_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, file_name))
+            except OSError:
+                pass
+    return size
+
+
+def evict_profiles(max_size=PROFILES_MAX_SIZE):
+    """
+    Удалять давно не использованные профили, пока все профили не уложатся в max_size.
+    Обходит все файлы профилей, поэтому вызывается один раз при запуске фермы, а не для каждого аккаунта.
+    """
+    if not os.path.isdir(PROFILES_DIR):
+        return
+
+    with _profiles_lock:
+        profiles = []
+        for entry in os.scandir(PROFILES_DIR):
+            if entry.is_dir():
+                profiles.append((entry.stat().st_mtime, entry.path, get_directory_size(entry.path)))
+
+        total_size = sum(size for _, _, size in profiles)
+        for _, path, size in sorted(profiles):
+            if total_size <= max_size:
+                break
+            if path in _active_profiles:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+            logger.info(f"Browser profile has been evicted: {os.path.basename(path)}.")
+
+
+def profile_dir_name(name):
+    """ Имя каталога профиля: читаемая часть и хэш исходного имени, чтобы "a b" и "a_b" не делили профиль. """
+    name = str(name)
+    readable = re.sub(r'[^\w.-]', '_', name)
+    return f"{readable}-{hashlib.sha1(name.encode()).hexdigest()[:8]}"
+
+
+def acquire_profile_dir(name):
+    """ Каталог профиля аккаунта. Отмечается как используемый, чтобы его не вытеснили. """
+    path = os.path.join(PROFILES_DIR, profile_dir_name(name))
+    with _profiles_lock:
+        os.makedirs(path, exist_ok=True)
+        now = time.time()
+        os.utime(path, (now, now))
+        _active_profiles.add(path)
+    return path
+
+
+def release_profile_dir(path):
+    with _profiles_lock:
+        _active_profiles.discard(path)
+        if os.path.isdir(path):
+            now = time.time()
+            os.utime(path, (now, now))
+
+
+def get_driver_pid(driver):
+    """ pid процесса драйвера: им помечаются метрики браузера, которым пользуются несколько аккаунтов. """
+    try:
+        return driver.service.process.pid
+    except AttributeError:
+        return None
+
+
+def get_driver_rss(driver):
+    """ Суммарная память (RSS, байты) драйвера и всех процессов браузера. None без psutil. """
+    if psutil is None:
+        return None
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        processes = [process] + process.children(recursive=True)
+    except (AttributeError, psutil.Error):
+        return None
+
+    rss = 0
+    for process in processes:
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss
+
+
+def setup_webdriver(browser_name, headless, profile="default", user_data_dir=None,
+                    blocked_sites=BLOCKED_SITES, count_blocked=False):
+    driver_binary = os.environ.get(DRIVER_BINARY_ENV)
+    browser_binary = os.environ.get(BROWSER_BINARY_ENV)
+
     if browser_name in ["chrome", "brave", "yandex", "vivaldi"]:
-        service = webdriver.ChromeService()
+        service = webdriver.ChromeService(executable_path=driver_binary)
         options = webdriver.ChromeOptions()
+        if browser_binary:
+            options.binary_location = browser_binary
+        if user_data_dir:
+            options.add_argument(f'--user-data-dir={user_data_dir}')
+            options.add_argument(f'--disk-cache-size={PROFILE_DISK_CACHE_SIZE}')
         if headless:
             options.add_argument('--headless=old')
             options.add_argument('--disable-gpu')
             options.add_argument('--no-sandbox')
             options.add_argument('--log-level=3')
-        return webdriver.Chrome(service=service, options=options)
+        if profile == "lean":
+            apply_lean_chromium_options(options)
+        apply_blocked_sites_chromium_options(options, blocked_sites, count_blocked)
+        driver = webdriver.Chrome(service=service, options=options)
+        apply_chromium_session(driver, profile, blocked_sites)
+        driver.hamster_blocked_sites = bool(blocked_sites)
+        driver.hamster_request_log = count_blocked
+        return driver
 
     elif browser_name == "edge":
-        service = webdriver.EdgeService()
+        service = webdriver.EdgeService(executable_path=driver_binary)
         options = webdriver.EdgeOptions()
+        if browser_binary:
+            options.binary_location = browser_binary
+        if user_data_dir:
+            options.add_argument(f'--user-data-dir={user_data_dir}')
+            options.add_argument(f'--disk-cache-size={PROFILE_DISK_CACHE_SIZE}')
         if headless:
             options.add_argument('--headless=old')
             options.add_argument('--disable-gpu')
             options.add_argument('--no-sandbox')
             options.add_argument('--log-level=3')
-        return webdriver.Edge(service=service, options=options)
+        if profile == "lean":
+            apply_lean_chromium_options(options)
+        apply_blocked_sites_chromium_options(options, blocked_sites, count_blocked)
+        driver = webdriver.Edge(service=service, options=options)
+        apply_chromium_session(driver, profile, blocked_sites)
+        driver.hamster_blocked_sites = bool(blocked_sites)
+        driver.hamster_request_log = count_blocked
+        return driver
 
     elif browser_name == "firefox":
-        service = webdriver.FirefoxService()
+        service = webdriver.FirefoxService(executable_path=driver_binary)
         options = webdriver.FirefoxOptions()
+        if browser_binary:
+            options.binary_location = browser_binary
+        if user_data_dir:
+            options.add_argument('-profile')
+            options.add_argument(user_data_dir)
         options.headless = headless
-        return webdriver.Firefox(service=service, options=options)
+        if profile == "lean":
+            apply_lean_firefox_options(options)
+        apply_blocked_sites_firefox_options(options, blocked_sites)
+        driver = webdriver.Firefox(service=service, options=options)
+        driver.hamster_blocked_sites = bool(blocked_sites)
+        return driver
 
     elif browser_name == "ie":
-        service = webdriver.IeService()
+        service = webdriver.IeService(executable_path=driver_binary)
         options = webdriver.IeOptions()
         options.headless = headless
         return webdriver.Firefox(service=service, options=options)
@@ -117,9 +469,6 @@ def setup_webdriver(browser_name, headless):
     raise BrowserNotFoundError(f"No suitable WebDriver found for browser: {browser_name}")
 
 
-def get_web_driver(headless=True):
-    browsers = ["chrome", "edge", "firefox", "yandex", "brave", "vivaldi", "ie"]
-    for browser in browsers:
-        if get_browser_path(browser):
-            return setup_webdriver(browser, headless)
-    raise BrowserNotFoundError("No compatible browsers are installed.")
+def get_web_driver(headless=True, profile="default", user_data_dir=None, blocked_sites=BLOCKED_SITES,
+                   count_blocked=False):
+    return setup_webdriver(detect_browser(), headless, profile, user_data_dir, blocked_sites, count_blocked)
@@ -0,0 +1,56 @@
+import time
+import random
+from dataclasses import dataclass
+
+
+# Уровни восстановления от дешёвого к дорогому
+REFIND = "refind"  # повторить действие, элементы будут найдены заново
+RELOAD_IFRAME = "reload_iframe"  # перезагрузить только iframe хомяка
+RECYCLE_DRIVER = "recycle_driver"  # перезапустить браузер
+
+RECOVERY_LEVELS = (REFIND, RELOAD_IFRAME, RECYCLE_DRIVER)
+
+
+class RecoveryFailedError(Exception):
+    """ Custom exception when a step has failed at every recovery level. """
+    pass
+
+
+@dataclass
+class RecoveryEngine:
+    """
+    Политика восстановления одного аккаунта: уровень по номеру попытки, задержка с джиттером
+    и предохранитель, который ставит аккаунт на паузу после серии неудачных восстановлений.
+    """
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    max_failures: int = 5
+    cooldown: float = 5 * 60
+
+    failures: int = 0
+    opened_at: float = 0.0
+
+    @staticmethod
+    def level(attempt: int, start_level: str = REFIND) -> str:
+        """ Уровень восстановления для attempt-й попытки (с 1), начиная с start_level. """
+        index = RECOVERY_LEVELS.index(start_level) + attempt - 1
+        return RECOVERY_LEVELS[min(index, len(RECOVERY_LEVELS) - 1)]
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def record_success(self):
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.max_failures:
+            self.opened_at = time.time()
+
+    def is_open(self) -> bool:
+        """ Предохранитель сработал: аккаунт отдыхает до retry_time(). """
+        return self.failures >= self.max_failures and time.time() < self.retry_time()
+
+    def retry_time(self) -> float:
+        return self.opened_at + self.cooldown
@@ -0,0 +1,102 @@
+from logging_config import logger
+
+import os
+import json
+import time
+import threading
+from typing import Dict, List, Optional
+
+from .snapshot import EarnItemState
+
+base_path = os.path.dirname(__file__)
+
+REWARD_STATE_PATH = os.path.join(base_path, "reward_state.json")
+
+DAILY_RESET_HOUR = 12  # UTC, когда в игре обновляются ежедневные задания
+
+
+def reset_period(timestamp: Optional[float] = None) -> int:
+    """ Начало текущих игровых суток (UTC), секунды. """
+    timestamp = time.time() if timestamp is None else timestamp
+    day = 24 * 60 * 60
+    offset = DAILY_RESET_HOUR * 60 * 60
+    return int((timestamp - offset) // day * day + offset)
+
+
+def confirmed_items(clicked: List[EarnItemState], earn_items_after: List[EarnItemState]) -> List[EarnItemState]:
+    """
+    Нажатые задания, которые на странице после нажатий отмечены выполненными. Нажатие в окне задания
+    не подтверждение: у заданий-ссылок первое нажатие только открывает ссылку, а выполнит его "Check".
+    """
+    completed = {item.key for item in earn_items_after if item.completed}
+    return [item for item in clicked if item.key in completed]
+
+
+class RewardStateStore:
+    """
+    Задания раздела Earn, которые аккаунт уже нажимал в текущих игровых сутках.
+    После сброса заданий в игре состояние аккаунта начинается заново.
+    """
+
+    def __init__(self, path: str = REWARD_STATE_PATH):
+        self.path = path
+        # {аккаунт: {"period": начало суток, "items": [ключи заданий]}}
+        self.accounts: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.loaded = False
+
+    def load(self):
+        with self.lock:
+            if self.loaded:
+                return
+            self.loaded = True
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    self.accounts.update(json.load(file))
+            except (OSError, ValueError):
+                pass
+
+    def save(self):
+        """ Дописать свои аккаунты в файл: шарды фермы делят его между собой. """
+        with self.lock:
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                data = {}
+            data.update(self.accounts)
+
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(temp_path, "w", encoding="utf-8") as file:
+                    json.dump(data, file, indent=2, ensure_ascii=False)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Failed to save the reward state: {e}")
+
+    def claimed(self, account: str) -> set:
+        self.load()
+        state = self.accounts.get(account)
+        if state is None or state.get("period") != reset_period():
+            return set()
+        return set(state.get("items", []))
+
+    def pending(self, account: str, earn_items: List[EarnItemState]) -> List[EarnItemState]:
+        """ Задания, которые ещё не выполнены на странице и не нажимались в эти сутки. """
+        claimed = self.claimed(account)
+        return [item for item in earn_items if not item.completed and item.key not in claimed]
+
+    def mark_claimed(self, account: str, items: List[EarnItemState]):
+        self.mark_keys(account, {item.key for item in items})
+
+    def mark_keys(self, account: str, keys: set):
+        """ Отметить выполненными задания (или другие ежедневные активности) по ключам. """
+        if not keys:
+            return
+        claimed = self.claimed(account)
+        with self.lock:
+            self.accounts[account] = {"period": reset_period(), "items": sorted(claimed | set(keys))}
+        self.save()
+
+
+reward_state = RewardStateStore()
@@ -0,0 +1,260 @@
+""" JavaScript, который выполняется внутри iframe хомяка. """
+
+# Пачка нажатий по кнопке хомяка за один вызов execute_async_script.
+# arguments: количество нажатий, минимальная и максимальная задержка (мс),
+# стоимость одного нажатия в энергии, callback.
+# Останавливается, как только счётчик энергии на странице опустится ниже стоимости нажатия.
+# Возвращает {taps, energy, errors}.
+TAP_BATCH_SCRIPT = """
+var count = arguments[0];
+var minDelay = arguments[1];
+var maxDelay = arguments[2];
+var energyPerTap = arguments[3];
+var done = arguments[arguments.length - 1];
+var result = {taps: 0, energy: null, errors: []};
+
+function readEnergy() {
+    var p = document.querySelector('div.user-tap-energy p');
+    if (!p || p.textContent.indexOf('/') === -1) {
+        return null;
+    }
+    return parseInt(p.textContent.split('/')[0].replace(/\\s/g, ''), 10);
+}
+
+function fire(button, type, x, y) {
+    var init = {bubbles: true, cancelable: true, view: window, clientX: x, clientY: y,
+                pointerId: 1, pointerType: 'touch', isPrimary: true};
+    var event = type.indexOf('pointer') === 0 ? new PointerEvent(type, init) : new MouseEvent(type, init);
+    button.dispatchEvent(event);
+}
+
+function finish() {
+    result.energy = readEnergy();
+    done(result);
+}
+
+function tap(i) {
+    var energy = readEnergy();
+    if (i >= count || (energy !== null && energy < energyPerTap)) {
+        finish();
+        return;
+    }
+    var button = document.querySelector('.user-tap-button');
+    if (!button) {
+        result.errors.push('Tap button was not found.');
+        finish();
+        return;
+    }
+    try {
+        var rect = button.getBoundingClientRect();
+        var x = rect.left + rect.width * (0.3 + Math.random() * 0.4);
+        var y = rect.top + rect.height * (0.3 + Math.random() * 0.4);
+        ['pointerdown', 'mousedown', 'pointerup', 'mouseup', 'click'].forEach(function (type) {
+            fire(button, type, x, y);
+        });
+        result.taps += 1;
+    } catch (e) {
+        result.errors.push(String(e));
+    }
+    setTimeout(function () { tap(i + 1); }, minDelay + Math.random() * (maxDelay - minDelay));
+}
+
+tap(0);
+"""
+
+# Ввод слова шифра Морзе нажатиями по кнопке хомяка за один вызов execute_async_script.
+# arguments: план [[нажатие, пауза после], ...] (мс), callback.
+# Возвращает {presses, errors}.
+MORSE_SCRIPT = """
+var plan = arguments[0];
+var done = arguments[arguments.length - 1];
+var result = {presses: 0, errors: []};
+
+function fire(button, type) {
+    var rect = button.getBoundingClientRect();
+    var init = {bubbles: true, cancelable: true, view: window,
+                clientX: rect.left + rect.width / 2, clientY: rect.top + rect.height / 2,
+                pointerId: 1, pointerType: 'touch', isPrimary: true};
+    var event = type.indexOf('pointer') === 0 ? new PointerEvent(type, init) : new MouseEvent(type, init);
+    button.dispatchEvent(event);
+}
+
+function press(i) {
+    if (i >= plan.length) {
+        done(result);
+        return;
+    }
+    var button = document.querySelector('.user-tap-button');
+    if (!button) {
+        result.errors.push('Tap button was not found.');
+        done(result);
+        return;
+    }
+    try {
+        fire(button, 'pointerdown');
+        fire(button, 'mousedown');
+    } catch (e) {
+        result.errors.push(String(e));
+    }
+    setTimeout(function () {
+        try {
+            fire(button, 'pointerup');
+            fire(button, 'mouseup');
+            fire(button, 'click');
+            result.presses += 1;
+        } catch (e) {
+            result.errors.push(String(e));
+        }
+        setTimeout(function () { press(i + 1); }, plan[i][1]);
+    }, plan[i][0]);
+}
+
+press(0);
+"""
+
+# Состояние страницы хомяка за один вызов execute_script.
+# Возвращает {energy, maxEnergy, username, activeTab, popup, boostAvailable, earnItems}.
+SNAPSHOT_SCRIPT = """
+function text(selector, root) {
+    var element = (root || document).querySelector(selector);
+    return element ? element.textContent.trim() : null;
+}
+
+var energy = null, maxEnergy = null;
+var energyText = text('div.user-tap-energy p');
+if (energyText && energyText.indexOf('/') !== -1) {
+    var parts = energyText.split('/');
+    energy = parseInt(parts[0].replace(/\\s/g, ''), 10);
+    maxEnergy = parseInt(parts[1].replace(/\\s/g, ''), 10);
+}
+
+var activeTab = null;
+var barItems = document.querySelectorAll('.app-bar-item');
+for (var i = 0; i < barItems.length; i++) {
+    if (/active/.test(barItems[i].className)) {
+        activeTab = i;
+        break;
+    }
+}
+
+var earnItems = [];
+var columns = document.querySelectorAll('.earn-column');
+for (var c = 0; c < columns.length; c++) {
+    var items = columns[c].querySelectorAll('.earn-item');
+    for (var n = 0; n < items.length; n++) {
+        var item = items[n];
+        earnItems.push({
+            column: c,
+            index: n,
+            title: text('.earn-item-title', item) || item.textContent.trim().slice(0, 80),
+            completed: /completed|done/.test(item.className) || !!item.querySelector('[class*="check"]')
+        });
+    }
+}
+
+return {
+    energy: isNaN(energy) ? null : energy,
+    maxEnergy: isNaN(maxEnergy) ? null : maxEnergy,
+    username: text('a.user-info p'),
+    activeTab: activeTab,
+    popup: !!document.querySelector('[class*="bottom-sheet"] .bottom-sheet-button, .bottom-sheet-close'),
+    boostAvailable: !!document.querySelector('.user-tap-boost'),
+    earnItems: earnItems
+};
+"""
+
+
+# Наблюдатель за всплывающими окнами (bottom sheet), устанавливается в iframe один раз.
+# Когда окно появляется, нажимает его основную кнопку, а если окно не закрылось - крестик,
+# и записывает это в журнал. arguments: задержка перед нажатием (мс).
+# Возвращает true, если наблюдатель установлен этим вызовом.
+POPUP_WATCHER_SCRIPT = """
+var delay = arguments[0];
+if (window.hamsterPopupWatcher) {
+    return false;
+}
+
+var watcher = {log: [], timer: null};
+var handled = new WeakSet();
+
+function press(button, action) {
+    handled.add(button);
+    var sheet = button.closest('[class*="bottom-sheet"]') || button.parentElement;
+    var title = sheet && sheet.querySelector('h1, h2, h3, [class*="title"]');
+    try {
+        button.click();
+    } catch (e) {
+        action = 'failed: ' + e;
+    }
+    watcher.log.push({
+        time: Date.now(),
+        title: title ? title.textContent.trim().slice(0, 80) : '',
+        action: action
+    });
+    if (watcher.log.length > 100) {
+        watcher.log.shift();
+    }
+}
+
+function handle() {
+    watcher.timer = null;
+    var large = document.querySelector('.bottom-sheet-button.button.button-primary.button-large');
+    var close = document.querySelector('.bottom-sheet-close');
+    if (large && !large.disabled && !handled.has(large)) {
+        press(large, 'pressed');
+    } else if (close && !handled.has(close)) {
+        press(close, 'closed');
+    } else {
+        return;
+    }
+    // Окно могло остаться открытым без новых изменений DOM
+    schedule();
+}
+
+function schedule() {
+    if (!watcher.timer) {
+        watcher.timer = setTimeout(handle, delay);
+    }
+}
+
+watcher.drain = function() {
+    var log = watcher.log;
+    watcher.log = [];
+    return log;
+};
+
+new MutationObserver(schedule).observe(document.body, {childList: true, subtree: true});
+window.hamsterPopupWatcher = watcher;
+// Окно, открытое до установки наблюдателя
+schedule();
+return true;
+"""
+
+# Журнал наблюдателя с прошлого вызова или null, если наблюдатель не установлен (iframe перезагружен).
+POPUP_LOG_SCRIPT = """
+return window.hamsterPopupWatcher ? window.hamsterPopupWatcher.drain() : null;
+"""
+
+
+def block_sites_script(blocked_urls: list) -> str:
+    """ Подмена window.open, которая не открывает сайты из списка. Повторный вызов ничего не делает. """
+    blocked_urls_script = ", ".join(f"'{url}'" for url in blocked_urls)
+    return f"""
+        (function() {{
+            if (window.open && window.open.hamsterBlocked) {{
+                return;
+            }}
+            var originalOpen = window.open;
+            window.open = function(url, name, specs) {{
+                var blockedUrls = [{blocked_urls_script}];
+                for (var i = 0; i < blockedUrls.length; i++) {{
+                    if (url.includes(blockedUrls[i])) {{
+                        console.log('Blocked attempt to open URL: ' + url);
+                        return null;
+                    }}
+                }}
+                return originalOpen.apply(this, arguments);
+            }};
+            window.open.hamsterBlocked = true;
+        }})();
+    """
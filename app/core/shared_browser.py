@@ -0,0 +1,63 @@
+from logging_config import logger
+
+import threading
+from typing import List
+
+from selenium.common.exceptions import WebDriverException
+
+from .my_driver import BLOCKED_SITES, get_web_driver, block_urls_in_tab
+
+
+class SharedBrowser:
+    """
+    Один браузер и один WebDriver на несколько аккаунтов, у каждого своя вкладка.
+    WebDriver умеет работать только с одной вкладкой и одним iframe за раз,
+    поэтому аккаунты работают с ним по очереди через lock.
+    """
+
+    def __init__(self, headless: bool, profile: str = "default",
+                 blocked_sites=BLOCKED_SITES, count_blocked: bool = False):
+        self.driver = get_web_driver(headless=headless, profile=profile,
+                                     blocked_sites=blocked_sites, count_blocked=count_blocked)
+        self.lock = threading.RLock()
+        self.handles: List[str] = []
+        self.accounts = 0
+        self.blank_handle = self.driver.current_window_handle
+        logger.info(f"Shared WebDriver has been successfully initialized.")
+
+    def open_tab(self) -> str:
+        """ Открыть вкладку для нового аккаунта и переключиться в неё. Вызывать под lock. """
+        if self.blank_handle is not None:
+            handle, self.blank_handle = self.blank_handle, None
+            self.driver.switch_to.window(handle)
+        else:
+            self.driver.switch_to.new_window('tab')
+            handle = self.driver.current_window_handle
+            # Network.setBlockedURLs действует только в той вкладке, где его вызвали
+            block_urls_in_tab(self.driver)
+        self.handles.append(handle)
+        return handle
+
+    def close_tab(self, handle: str):
+        """ Закрыть вкладку аккаунта. Последняя вкладка остаётся пустой, чтобы браузер не закрылся. """
+        with self.lock:
+            try:
+                self.driver.switch_to.window(handle)
+                if len(self.handles) > 1:
+                    self.driver.close()
+                else:
+                    self.driver.get("about:blank")
+                    self.blank_handle = handle
+            except WebDriverException:
+                logger.info(f"The browser tab was closed before WebDriver was stopped.")
+
+            if handle in self.handles:
+                self.handles.remove(handle)
+
+    def quit(self):
+        with self.lock:
+            try:
+                self.driver.quit()
+                logger.info(f"Shared WebDriver has been stopped.")
+            except WebDriverException:
+                logger.info(f"The browser window was closed before WebDriver was stopped.")
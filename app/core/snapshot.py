@@ -0,0 +1,41 @@
+from typing import List, Optional
+from dataclasses import dataclass, field
+
+
+@dataclass
+class EarnItemState:
+    column: int
+    index: int
+    title: str
+    completed: bool = False
+
+    @property
+    def key(self) -> str:
+        """ Задание узнаётся по колонке и названию: порядок в колонке может меняться. """
+        return f"{self.column}:{self.title}"
+
+
+@dataclass
+class HamsterSnapshot:
+    """ Состояние страницы хомяка, снятое одним execute_script. """
+    energy: Optional[int] = None
+    max_energy: Optional[int] = None
+    username: Optional[str] = None
+    active_tab: Optional[int] = None
+    popup: bool = False
+    boost_available: bool = False
+    earn_items: List[EarnItemState] = field(default_factory=list)
+
+    @classmethod
+    def from_script(cls, data: dict) -> "HamsterSnapshot":
+        return cls(energy=data.get('energy'),
+                   max_energy=data.get('maxEnergy'),
+                   username=data.get('username'),
+                   active_tab=data.get('activeTab'),
+                   popup=bool(data.get('popup')),
+                   boost_available=bool(data.get('boostAvailable')),
+                   earn_items=[EarnItemState(**item) for item in data.get('earnItems') or []])
+
+    @property
+    def has_energy(self) -> bool:
+        return self.energy is not None and self.max_energy is not None
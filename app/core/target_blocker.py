@@ -0,0 +1,90 @@
+from logging_config import logger
+
+import json
+import itertools
+import threading
+import urllib.request
+from typing import List, Optional
+
+import websocket  # websocket-client, устанавливается вместе с selenium
+
+# Цели DevTools, у которых есть своя сеть: вкладки и iframe в отдельных процессах
+BLOCKED_TARGET_TYPES = ("page", "iframe")
+
+
+def get_debugger_address(driver) -> Optional[str]:
+    """ host:port DevTools браузера Chromium из возможностей сессии WebDriver (goog:chromeOptions и т.п.). """
+    for name, value in driver.capabilities.items():
+        if name.endswith("Options") and isinstance(value, dict) and value.get("debuggerAddress"):
+            return value["debuggerAddress"]
+    return None
+
+
+class TargetBlocker:
+    """
+    Отдельное DevTools-соединение с браузером, которое подключается к каждой вкладке и каждому
+    iframe (Target.setAutoAttach) и включает в них Network.setBlockedURLs. CDP-команда через
+    WebDriver действует только на текущую вкладку и не достаёт до iframe в другом процессе.
+    """
+
+    def __init__(self, ws_url: str, urls: List[str]):
+        self.urls = urls
+        self.counter = itertools.count(1)
+        self.send_lock = threading.Lock()
+        # Без заголовка Origin браузер принимает соединение без --remote-allow-origins
+        self.ws = websocket.create_connection(ws_url, timeout=10, suppress_origin=True)
+        self.ws.settimeout(None)
+        self.auto_attach()
+        self.thread = threading.Thread(name="Target Blocker", target=self.read_loop, daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def for_driver(cls, driver, urls: List[str]) -> "TargetBlocker":
+        address = get_debugger_address(driver)
+        if address is None:
+            raise ValueError("The WebDriver session has no DevTools address.")
+        with urllib.request.urlopen(f"http://{address}/json/version", timeout=10) as response:
+            version = json.load(response)
+        return cls(version["webSocketDebuggerUrl"], urls)
+
+    def send(self, method: str, params: Optional[dict] = None, session_id: Optional[str] = None):
+        """ Команда без ожидания ответа: сессия выполняет команды по порядку. """
+        message = {'id': next(self.counter), 'method': method, 'params': params or {}}
+        if session_id:
+            message['sessionId'] = session_id
+        with self.send_lock:
+            self.ws.send(json.dumps(message))
+
+    def auto_attach(self, session_id: Optional[str] = None):
+        # Новая цель ждёт, пока в ней не включат блокировку, и только потом начинает загрузку
+        self.send('Target.setAutoAttach', {'autoAttach': True, 'waitForDebuggerOnStart': True, 'flatten': True},
+                  session_id)
+
+    def on_attached(self, params: dict):
+        session_id = params['sessionId']
+        try:
+            if params.get('targetInfo', {}).get('type') in BLOCKED_TARGET_TYPES:
+                self.send('Network.enable', {}, session_id)
+                self.send('Network.setBlockedURLs', {'urls': self.urls}, session_id)
+                self.auto_attach(session_id)
+        finally:
+            self.send('Runtime.runIfWaitingForDebugger', {}, session_id)
+
+    def read_loop(self):
+        try:
+            while True:
+                data = json.loads(self.ws.recv())
+                if data.get('method') == 'Target.attachedToTarget':
+                    self.on_attached(data['params'])
+        except (websocket.WebSocketException, OSError, ValueError):
+            # Браузер закрыт вместе с WebDriver
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        try:
+            self.ws.close()
+        except (websocket.WebSocketException, OSError):
+            pass
+        logger.info(f"Target blocker has been stopped.")
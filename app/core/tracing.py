@@ -0,0 +1,93 @@
+from logging_config import logger
+
+import json
+import time
+import threading
+from collections import deque
+from typing import Optional
+
+
+class CommandTracer:
+    """
+    Запись каждой команды WebDriver (имя, локатор, длительность, результат) в кольцевой буфер
+    с выгрузкой в формате Chrome trace-event (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, capacity: int = 100_000):
+        self.events = deque(maxlen=capacity)
+        self.local = threading.local()
+        self.enabled = False
+
+    def set_account(self, account: str):
+        """ Аккаунт, к которому относятся команды текущего потока. """
+        self.local.account = account
+
+    def install(self, driver):
+        """ Обернуть command_executor драйвера. Повторная установка ничего не делает. """
+        executor = driver.command_executor
+        if getattr(executor, "hamster_traced", False):
+            return
+
+        execute = executor.execute
+
+        def traced_execute(command, params):
+            start_time = time.perf_counter()
+            outcome = "ok"
+            try:
+                return execute(command, params)
+            except Exception as e:
+                outcome = type(e).__name__
+                raise
+            finally:
+                if self.enabled:
+                    self.events.append((start_time, time.perf_counter() - start_time, command,
+                                        locator(params), outcome, getattr(self.local, "account", None),
+                                        threading.get_ident()))
+
+        executor.execute = traced_execute
+        executor.hamster_traced = True
+
+    def to_chrome_trace(self, account: Optional[str] = None,
+                        start: Optional[float] = None, end: Optional[float] = None) -> dict:
+        """ События за окно [start, end] (time.perf_counter) для одного аккаунта или всех. """
+        trace_events = []
+        pids = {}
+        for start_time, duration, command, command_locator, outcome, event_account, tid in list(self.events):
+            if account is not None and event_account != account:
+                continue
+            if (start is not None and start_time < start) or (end is not None and start_time > end):
+                continue
+
+            if event_account not in pids:
+                pids[event_account] = len(pids) + 1
+                trace_events.append({"name": "process_name", "ph": "M", "pid": pids[event_account],
+                                     "args": {"name": event_account or "unknown"}})
+
+            args = {"outcome": outcome}
+            if command_locator:
+                args["locator"] = command_locator
+            trace_events.append({"name": command, "cat": "webdriver", "ph": "X",
+                                 "ts": round(start_time * 1e6), "dur": round(duration * 1e6),
+                                 "pid": pids[event_account], "tid": tid, "args": args})
+
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def dump(self, path: str, account: Optional[str] = None, window: Optional[float] = None):
+        """ Сохранить трассу; window - только последние window секунд. """
+        start = time.perf_counter() - window if window else None
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.to_chrome_trace(account=account, start=start), file)
+        logger.info(f"WebDriver trace has been saved to {path}.")
+
+
+def locator(params: Optional[dict]) -> Optional[str]:
+    if not params:
+        return None
+    if "using" in params and "value" in params:
+        return f"{params['using']}={params['value']}"
+    if "id" in params:
+        return f"element={params['id']}"
+    return None
+
+
+tracer = CommandTracer()
@@ -1,11 +1,14 @@
+from logging_config import logger
+
 import os
 import uuid
 import json
 import threading
 import customtkinter as ctk
 
-from .core import HamsterFarm
+from .core import HamsterFarm, metrics
 from .my_widgets import (MyToplevelWindow,
+                         MyTextWindow,
                          MyInputFrame,
                          MyInputManagerFrame,
                          MyOptionFrame,
@@ -28,6 +31,7 @@ def validate_numeric_input(value: str) -> bool:
 
 class MainPage(ctk.CTkFrame):
     error_window = None
+    metrics_window = None
 
     def __init__(self, parent, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
@@ -42,6 +46,7 @@ class MainPage(ctk.CTkFrame):
         self.grid_rowconfigure(0, weight=1)
 
         self.hamster_farm = HamsterFarm()
+        self.farm_options = {}
         self.is_farming = False
 
         # Команды валидации
@@ -96,7 +101,10 @@ class MainPage(ctk.CTkFrame):
 
         self.launch_button = ctk.CTkButton(self.right_frame, text="Start Farming", font=("Aral", 24), fg_color="green",
                                            command=self.toggle_farming_event)
-        self.launch_button.grid(row=2, column=0, padx=(10, 10), pady=(10, 10), sticky="nsew")
+        self.launch_button.grid(row=2, column=0, padx=(10, 10), pady=(10, 5), sticky="nsew")
+
+        self.metrics_button = ctk.CTkButton(self.right_frame, text="Show Metrics", command=self.metrics_event)
+        self.metrics_button.grid(row=3, column=0, padx=(10, 10), pady=(5, 10), sticky="nsew")
 
     def update_farm_parameters(self):
         self.hamster_farm.platform = str(self.platform_frame.get())
@@ -107,6 +115,15 @@ class MainPage(ctk.CTkFrame):
         self.hamster_farm.claim_daily_rewards = bool(self.checkbox_frame.get()["Claim Daily Rewards"])
         self.hamster_farm.use_energy_boosts = bool(self.checkbox_frame.get()["Use Energy Boosts"])
 
+        # Дополнительные параметры фермы из файла конфигурации (workers, tap_mode, ...)
+        # Только объявленные настройки: состояние фермы (users, threads, ...) из файла не меняется
+        farm_options = self.hamster_farm.options()
+        for option, value in self.farm_options.items():
+            if option in farm_options:
+                setattr(self.hamster_farm, option, value)
+            else:
+                logger.warning(f"Unknown farm option in the config file: {option}.")
+
         if not self.hamster_farm.platform:
             return f"Platform is empty!"
 
@@ -143,6 +160,13 @@ class MainPage(ctk.CTkFrame):
             else:
                 self.error_event(f"Telegram Account List is empty!")
 
+    def metrics_event(self):
+        if self.metrics_window is None or not self.metrics_window.winfo_exists():
+            self.metrics_window = MyTextWindow(self, title="Farm Metrics",
+                                               get_text=lambda: json.dumps(metrics.to_json(), indent=2))
+        else:
+            self.metrics_window.focus()
+
     @staticmethod
     def appearance_mode_event(mode: str):
         ctk.set_appearance_mode(mode)
@@ -156,6 +180,7 @@ class MainPage(ctk.CTkFrame):
                 self.num_clicks_frame.set(config_data["num_clicks"])
                 self.users_frame.set(config_data["users"])
                 self.checkbox_frame.set(config_data["checkboxes"])
+                self.farm_options = config_data.get("farm_options", {})
         else:
             self.error_event(f"Can't load to file:\n{file_path}\n- because it's not found!")
 
@@ -169,6 +194,7 @@ class MainPage(ctk.CTkFrame):
                     "num_clicks": self.num_clicks_frame.get(default_value="100"),
                     "users": self.users_frame.get(default_name=lambda: uuid.uuid4()),
                     "checkboxes": self.checkbox_frame.get(),
+                    "farm_options": self.farm_options,
                 }
                 with open(file_path, "w") as config:
                     config.write(json.dumps(config_data, indent=4))
@@ -12,6 +12,35 @@ class MyToplevelWindow(ctk.CTkToplevel):
         self.label.pack(padx=100, pady=100)
 
 
+class MyTextWindow(ctk.CTkToplevel):
+    def __init__(self, app, title: str, get_text: Callable[[], str], refresh_ms: int = 2000):
+        super().__init__(app)
+        self.title(title)
+        self.geometry("600x400")
+        self.get_text = get_text
+        self.refresh_ms = refresh_ms
+
+        self.textbox = ctk.CTkTextbox(self, wrap="none", font=("Courier", 12))
+        self.textbox.pack(padx=10, pady=10, fill="both", expand=True)
+
+        self.refresh_id = None
+        self.refresh()
+
+    def refresh(self):
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.textbox.insert("1.0", self.get_text())
+        self.textbox.configure(state="disabled")
+        self.refresh_id = self.after(self.refresh_ms, self.refresh)
+
+    def destroy(self):
+        # Закрытое окно не должно обновляться по таймеру
+        if self.refresh_id is not None:
+            self.after_cancel(self.refresh_id)
+            self.refresh_id = None
+        super().destroy()
+
+
 class MyInputFrame(ctk.CTkFrame):
     def __init__(self, parent, text: str, placeholder_text: str, validate_cmd: Tuple[str, str]):
         super().__init__(parent)
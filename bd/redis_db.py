@@ -1,11 +1,19 @@
 from logging_config import logger
 
 from threading import Lock
-from typing import Union, Optional
-from redis import Redis
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from redis import Redis, BlockingConnectionPool
 
 from config import REDIS_HOST, REDIS_PASSWORD, REDIS_PORT
 
+REDIS_MAX_CONNECTIONS = 20  # соединений в пуле на процесс
+REDIS_POOL_TIMEOUT = 10  # секунд ожидания свободного соединения из пула
+REDIS_SOCKET_TIMEOUT = 5  # секунд на ответ Redis
+REDIS_CONNECT_TIMEOUT = 5  # секунд на подключение
+REDIS_BATCH_SIZE = 500  # ключей на один SCAN и один pipeline
+
+USER_KEY_PREFIX = "user:"
+
 
 class RedisManager:
     _instance = None
@@ -18,24 +26,149 @@ class RedisManager:
                 cls._instance._initialize(*args, **kwargs)
             return cls._instance
 
-    def _initialize(self, db: int = 0):
+    def _initialize(self, db: int = 0, max_connections: int = REDIS_MAX_CONNECTIONS,
+                    pool_timeout: float = REDIS_POOL_TIMEOUT, socket_timeout: float = REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout: float = REDIS_CONNECT_TIMEOUT):
         """
-        Инициализирует подключение к базе данных Redis.
+        Инициализирует пул соединений с базой данных Redis.
         Этот метод вызывается только один раз при первом создании экземпляра.
 
         Аргументы:
-        - port: порт Redis (по умолчанию 13930)
         - db: номер базы данных Redis (по умолчанию 0)
+        - max_connections: размер пула соединений
+        - pool_timeout: сколько секунд ждать свободного соединения, когда все заняты
+        - socket_timeout: сколько секунд ждать ответа Redis
+        - socket_connect_timeout: сколько секунд ждать подключения к Redis
         """
         try:
-            self.db = Redis(host=REDIS_HOST, password=REDIS_PASSWORD, port=REDIS_PORT, db=db, decode_responses=True)
+            self.pool = BlockingConnectionPool(host=REDIS_HOST, password=REDIS_PASSWORD, port=REDIS_PORT, db=db,
+                                               max_connections=max_connections, timeout=pool_timeout,
+                                               socket_timeout=socket_timeout,
+                                               socket_connect_timeout=socket_connect_timeout,
+                                               decode_responses=True)
+            self.db = Redis(connection_pool=self.pool)
             logger.info("Successfully connected to Redis.")
         except Exception as e:
+            self.pool = None
             self.db = None
             logger.error(f"Error connecting to Redis: {e}")
 
-    def keys(self):
-        return self.db.keys('*')
+    @staticmethod
+    def user_key(telegram_id: str) -> str:
+        return f"{USER_KEY_PREFIX}{telegram_id}"
+
+    def keys(self, match: str = '*') -> List[str]:
+        """ Все ключи по шаблону. SCAN вместо KEYS не блокирует Redis на время обхода. """
+        return list(self.db.scan_iter(match=match, count=REDIS_BATCH_SIZE))
+
+    def iter_users(self, batch_size: int = REDIS_BATCH_SIZE) -> Iterator[Tuple[str, dict]]:
+        """
+        Метод для обхода всех пользователей в Redis без блокировки сервера.
+
+        Аргументы:
+        - batch_size: сколько ключей получать одним SCAN и читать одним pipeline.
+
+        Возвращает пары (Telegram ID, данные пользователя).
+        """
+        if not self.db:
+            logger.error("No connection to Redis.")
+            return
+
+        batch = []
+        for key in self.db.scan_iter(match=f"{USER_KEY_PREFIX}*", count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                yield from self._read_users(batch)
+                batch = []
+        if batch:
+            yield from self._read_users(batch)
+
+    def _read_users(self, keys: List[str]) -> Iterator[Tuple[str, dict]]:
+        pipeline = self.db.pipeline(transaction=False)
+        for key in keys:
+            pipeline.hgetall(key)
+        for key, data in zip(keys, pipeline.execute()):
+            if data:
+                yield key[len(USER_KEY_PREFIX):], data
+
+    def get_many_users(self, telegram_ids: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """
+        Метод для получения данных нескольких пользователей из Redis за один запрос.
+
+        Аргументы:
+        - telegram_ids: ID пользователей в Telegram.
+
+        Возвращает словарь {Telegram ID: данные пользователя или None, если их нет}.
+        """
+        telegram_ids = list(telegram_ids)
+        if not self.db:
+            logger.error("No connection to Redis.")
+            return {telegram_id: None for telegram_id in telegram_ids}
+
+        try:
+            pipeline = self.db.pipeline(transaction=False)
+            for telegram_id in telegram_ids:
+                pipeline.hgetall(self.user_key(telegram_id))
+            return {telegram_id: data or None for telegram_id, data in zip(telegram_ids, pipeline.execute())}
+        except Exception as e:
+            logger.error(f"Error getting user data from Redis: {e}")
+            return {telegram_id: None for telegram_id in telegram_ids}
+
+    def set_many_statuses(self, statuses: Dict[str, Union[int, bool]], batch_size: int = REDIS_BATCH_SIZE) -> bool:
+        """
+        Метод для обновления статусов нескольких пользователей в Redis пачками через pipeline.
+
+        Аргументы:
+        - statuses: словарь {Telegram ID: статус (0 | False = offline, 1 | True = online)}.
+        - batch_size: сколько пользователей обновлять одним pipeline.
+
+        Возвращает True, если все статусы успешно обновлены в Redis, и False в противном случае.
+        """
+        if not self.db:
+            logger.error("No connection to Redis.")
+            return False
+
+        try:
+            items = list(statuses.items())
+            for start in range(0, len(items), batch_size):
+                pipeline = self.db.pipeline(transaction=False)
+                for telegram_id, online_status in items[start:start + batch_size]:
+                    pipeline.hset(self.user_key(telegram_id), mapping={'online_status': str(int(online_status))})
+                pipeline.execute()
+            logger.info(f"The statuses of {len(items)} users were successfully updated in Redis.")
+            return True
+        except Exception as e:
+            logger.error(f"Error updating user statuses in Redis: {e}")
+            return False
+
+    def reset_statuses(self, online_status: Union[int, bool] = 0, batch_size: int = REDIS_BATCH_SIZE) -> bool:
+        """
+        Метод для установки одного статуса всем пользователям (например, всех в offline после сбоя).
+
+        Аргументы:
+        - online_status: новый статус всех пользователей.
+        - batch_size: сколько ключей получать одним SCAN и обновлять одним pipeline.
+
+        Возвращает True, если статусы успешно обновлены в Redis, и False в противном случае.
+        """
+        if not self.db:
+            logger.error("No connection to Redis.")
+            return False
+
+        try:
+            count = 0
+            pipeline = self.db.pipeline(transaction=False)
+            for key in self.db.scan_iter(match=f"{USER_KEY_PREFIX}*", count=batch_size):
+                pipeline.hset(key, mapping={'online_status': str(int(online_status))})
+                count += 1
+                if count % batch_size == 0:
+                    pipeline.execute()
+            pipeline.execute()
+            logger.info(f"The statuses of {count} users were successfully reset in Redis.")
+            return True
+        except Exception as e:
+            logger.error(f"Error resetting user statuses in Redis: {e}")
+            return False
 
     def set_user_data(self, telegram_id: str, password: str, online_status: Union[int, bool] = 0) -> bool:
         """
@@ -50,7 +183,7 @@ class RedisManager:
         """
         if self.db:
             try:
-                key = f"user:{telegram_id}"
+                key = self.user_key(telegram_id)
                 user_data = {
                     'password': str(password),
                     'online_status': str(int(online_status))
@@ -76,7 +209,7 @@ class RedisManager:
         """
         if self.db:
             try:
-                key = f"user:{telegram_id}"
+                key = self.user_key(telegram_id)
                 data = self.db.hgetall(key)
                 if data:
                     logger.info(f"User data with Telegram ID {telegram_id} was successfully retrieved from Redis.")
@@ -103,7 +236,7 @@ class RedisManager:
         """
         if self.db:
             try:
-                key = f"user:{telegram_id}"
+                key = self.user_key(telegram_id)
                 self.db.hset(key, mapping={'password': str(password)})
                 logger.info(f"The password of the user with Telegram ID {telegram_id} was successfully updated in Redis.")
                 return True
@@ -126,7 +259,7 @@ class RedisManager:
         """
         if self.db:
             try:
-                key = f"user:{telegram_id}"
+                key = self.user_key(telegram_id)
                 self.db.hset(key, mapping={'online_status': str(int(online_status))})
                 logger.info(f"The status of the user with Telegram ID {telegram_id} was successfully updated in Redis.")
                 return True
@@ -148,7 +281,7 @@ class RedisManager:
         """
         if self.db:
             try:
-                key = f"user:{telegram_id}"
+                key = self.user_key(telegram_id)
                 result = self.db.delete(key)
                 if result:
                     logger.info(f"User data with Telegram ID {telegram_id} has been successfully deleted from Redis.")
@@ -166,6 +299,7 @@ class RedisManager:
     def close(self):
         if self.db:
             self.db.close()
+            self.pool.disconnect()
             logger.info("Redis has been closed.")
 
 
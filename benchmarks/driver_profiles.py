@@ -0,0 +1,60 @@
+"""
+Сравнение профилей запуска браузера: память на аккаунт и время готовности страницы.
+
+Запуск из корня проекта:
+    python -m benchmarks.driver_profiles app/core/accounts/<name>.html --runs 3 --headless
+"""
+import os
+import time
+import argparse
+import statistics
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from app.core.my_driver import DRIVER_PROFILES, get_web_driver, get_driver_rss
+
+
+def measure(page, profile, headless, timeout):
+    """ Одна загрузка страницы аккаунта: (время до кнопки хомяка, RSS). """
+    driver = get_web_driver(headless=headless, profile=profile)
+    try:
+        start_time = time.perf_counter()
+        driver.get(os.path.abspath(page))
+        iframe = WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.CLASS_NAME, 'payment-verification'))
+        )
+        driver.switch_to.frame(iframe)
+        WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.CLASS_NAME, 'user-tap-button'))
+        )
+        page_ready = time.perf_counter() - start_time
+        return page_ready, get_driver_rss(driver)
+    finally:
+        driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("page", help="HTML-страница аккаунта (accounts/<name>.html)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--headless", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{'profile':<10}{'page ready, s':>16}{'RSS, MiB':>12}")
+    for profile in DRIVER_PROFILES:
+        ready_times, rss_values = [], []
+        for _ in range(args.runs):
+            page_ready, rss = measure(args.page, profile, args.headless, args.timeout)
+            ready_times.append(page_ready)
+            if rss is not None:
+                rss_values.append(rss / 2 ** 20)
+
+        rss_text = f"{statistics.median(rss_values):.0f}" if rss_values else "n/a"
+        print(f"{profile:<10}{statistics.median(ready_times):>16.2f}{rss_text:>12}")
+
+
+if __name__ == '__main__':
+    main()
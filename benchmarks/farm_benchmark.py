@@ -0,0 +1,122 @@
+"""
+Бенчмарк фермы без сети: локальный сервер отдаёт fake_hamster/index.html, который встраивается
+в обычный шаблон hamster.html. Для каждого числа аккаунтов печатает тапы в секунду,
+среднюю длительность цикла и память на аккаунт.
+
+Запуск из корня проекта:
+    python -m benchmarks.farm_benchmark --accounts 1 10 50 --duration 120 --headless
+    python -m benchmarks.farm_benchmark --accounts 50 --option workers=8 --option max_browsers=8
+"""
+import os
+import json
+import time
+import argparse
+import functools
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from app.core import HamsterFarm, metrics
+from app.core.my_driver import psutil
+
+base_path = os.path.dirname(__file__)
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve_fake_hamster():
+    handler = functools.partial(QuietHandler, directory=os.path.join(base_path, "fake_hamster"))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(name="Fake Hamster Server", target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def browsers_rss():
+    """ RSS всех дочерних процессов (драйверы и браузеры), байты. None без psutil. """
+    if psutil is None:
+        return None
+    rss = 0
+    for process in psutil.Process().children(recursive=True):
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss
+
+
+def metric_total(data, name, field=None):
+    total = 0
+    for account_metrics in data.values():
+        value = account_metrics.get(name)
+        if value is not None:
+            total += value[field] if field else value
+    return total
+
+
+def parse_option(text):
+    name, value = text.split("=", 1)
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def run(num_accounts, src, duration, headless, options):
+    metrics.reset()
+    farm = HamsterFarm(headless=headless, users=[(f"bench_{n}", src) for n in range(num_accounts)])
+    for name, value in options.items():
+        setattr(farm, name, value)
+
+    # В режиме потоков activate_farm сам ждёт запуска браузеров: тапы за это время не считаем
+    farm.activate_farm()
+    start_data = metrics.to_json()
+    start_time = time.perf_counter()
+    time.sleep(duration)
+    rss = browsers_rss()
+    data = metrics.to_json()
+    elapsed = time.perf_counter() - start_time
+    farm.deactivate_farm()
+
+    def delta(name, field=None):
+        return metric_total(data, name, field) - metric_total(start_data, name, field)
+
+    cycles = delta("hamster_cycle_seconds", "count")
+    cycle_time = delta("hamster_cycle_seconds", "sum")
+    return {
+        "accounts": num_accounts,
+        "taps_per_sec": delta("hamster_taps_sent_total") / elapsed,
+        "cycle_latency": cycle_time / cycles if cycles else None,
+        "rss_per_account": rss / num_accounts if rss is not None else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--duration", type=float, default=120, help="секунд измерения на каждый прогон")
+    parser.add_argument("--headless", action="store_true")
+    parser.add_argument("--page-query", default="max_energy=500&refill=50&popup_rate=0.02",
+                        help="параметры fake_hamster/index.html")
+    parser.add_argument("--option", action="append", default=[], type=parse_option,
+                        help="поле HamsterFarm, например workers=8")
+    args = parser.parse_args()
+
+    server = serve_fake_hamster()
+    # rewrite_html подставляет платформу в tgWebAppPlatform, как у настоящего src
+    src = (f"http://127.0.0.1:{server.server_address[1]}/index.html?{args.page_query}"
+           f"#tgWebAppPlatform=android")
+
+    print(f"{'accounts':>8}{'taps/s':>10}{'cycle, s':>10}{'RSS/account, MiB':>18}")
+    for num_accounts in args.accounts:
+        result = run(num_accounts, src, args.duration, args.headless, dict(args.option))
+        cycle = f"{result['cycle_latency']:.2f}" if result['cycle_latency'] is not None else "n/a"
+        rss = f"{result['rss_per_account'] / 2 ** 20:.0f}" if result['rss_per_account'] is not None else "n/a"
+        print(f"{result['accounts']:>8}{result['taps_per_sec']:>10.1f}{cycle:>10}{rss:>18}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
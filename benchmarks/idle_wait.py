@@ -0,0 +1,82 @@
+"""
+Нагрузка на CPU простаивающей фермы: аккаунты ждут восстановления энергии.
+Сравнивает старый цикл time.sleep(0.1), stop_event.wait(timeout) в потоке на аккаунт
+и общую очередь FarmScheduler. Браузер не нужен.
+
+Запуск из корня проекта:
+    python -m benchmarks.idle_wait --accounts 100 500 --duration 10
+"""
+import time
+import argparse
+import threading
+
+from app.core.farm_scheduler import FarmScheduler
+
+IDLE_TIME = 30 * 60  # аккаунт ждёт энергию дольше, чем длится замер
+
+
+def polling_account(stop_event, end_time):
+    while time.time() < end_time:
+        if not stop_event.is_set():
+            time.sleep(0.1)
+        else:
+            return
+
+
+def waiting_account(stop_event, end_time):
+    stop_event.wait(max(0.0, end_time - time.time()))
+
+
+def run_threads(target, num_accounts, duration):
+    stop_event = threading.Event()
+    end_time = time.time() + IDLE_TIME
+    threads = [threading.Thread(target=target, args=(stop_event, end_time), daemon=True)
+               for _ in range(num_accounts)]
+    for thread in threads:
+        thread.start()
+
+    cpu, stop_latency = measure(duration, stop_event.set, threads)
+    return cpu, stop_latency
+
+
+def run_scheduler(num_accounts, duration, workers=8):
+    scheduler = FarmScheduler(workers=workers)
+    for _ in range(num_accounts):
+        scheduler.schedule(time.time() + IDLE_TIME, lambda: None)
+    scheduler.start()
+    return measure(duration, scheduler.stop, [])
+
+
+def measure(duration, stop, threads):
+    """ (доля одного ядра за время простоя, секунды от stop до выхода всех потоков) """
+    time.sleep(1)  # потоки успели уснуть
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    time.sleep(duration)
+    cpu = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start)
+
+    stop_start = time.perf_counter()
+    stop()
+    for thread in threads:
+        thread.join()
+    return cpu, time.perf_counter() - stop_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--duration", type=float, default=10, help="секунд измерения на каждый прогон")
+    args = parser.parse_args()
+
+    print(f"{'accounts':>8}{'mode':>12}{'CPU, %':>10}{'stop, ms':>10}")
+    for num_accounts in args.accounts:
+        results = [
+            ("sleep(0.1)", run_threads(polling_account, num_accounts, args.duration)),
+            ("event.wait", run_threads(waiting_account, num_accounts, args.duration)),
+            ("scheduler", run_scheduler(num_accounts, args.duration)),
+        ]
+        for mode, (cpu, stop_latency) in results:
+            print(f"{num_accounts:>8}{mode:>12}{cpu * 100:>10.2f}{stop_latency * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,20 @@
+import os
 import sys
 import logging
 
 
 LOG_LEVEL = logging.DEBUG
+# Переменная окружения, которую супервизор выставляет процессам шардов: они дописывают в лог родителя
+LOG_APPEND_ENV = "HAMSTER_LOG_APPEND"
 
 # Logging settings
 logger = logging.getLogger(__name__)
 logger.setLevel(LOG_LEVEL)
 
 # Logging to file
-file_handler = logging.FileHandler('hamster.log', mode='w')
+file_handler = logging.FileHandler('hamster.log', mode='a' if os.environ.get(LOG_APPEND_ENV) else 'w')
 file_handler.setLevel(LOG_LEVEL)
-file_formatter = logging.Formatter(fmt='%(asctime)s - %(levelname)s -  %(threadName)s - %(message)s',
+file_formatter = logging.Formatter(fmt='%(asctime)s - %(levelname)s -  %(processName)s - %(threadName)s - %(message)s',
                                    datefmt='%Y-%m-%d %H:%M:%S')
 file_handler.setFormatter(file_formatter)
 logger.addHandler(file_handler)
@@ -19,7 +22,7 @@ logger.addHandler(file_handler)
 # Logging to console
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setLevel(LOG_LEVEL)
-console_formatter = logging.Formatter(fmt='%(asctime)s - %(levelname)s -  %(threadName)s - %(message)s',
+console_formatter = logging.Formatter(fmt='%(asctime)s - %(levelname)s -  %(processName)s - %(threadName)s - %(message)s',
                                       datefmt='%Y-%m-%d %H:%M:%S')
 console_handler.setFormatter(console_formatter)
 logger.addHandler(console_handler)
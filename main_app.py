@@ -1,6 +1,9 @@
+import multiprocessing
+
 from app import App
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # шарды фермы в сборке PyInstaller
     hamster_app = App()
     hamster_app.mainloop()
     hamster_app.close()